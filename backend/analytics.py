@@ -0,0 +1,232 @@
+"""Incrementally maintained sales rollups for the admin dashboard.
+
+Three small collections are kept up to date by the order routes:
+
+* ``sales_summary`` – one document with order counts by status and by
+  payment status, plus paid-order count, revenue and units;
+* ``sales_daily``   – one document per order day (``YYYY-MM-DD``, UTC);
+* ``sales_products`` – units and revenue per product.
+
+Revenue and units count once an order's payment is completed.
+
+The ``record_*`` functions run as background jobs, which may be retried, so
+each takes an ``event_id`` and every write it makes is applied at most once:
+a marker ``<event_id>:<part>`` is inserted into ``analytics_applied`` before
+the ``$inc`` and removed again if the ``$inc`` fails. Markers are dropped by
+a TTL index after ``ANALYTICS_EVENT_RETENTION_DAYS``. ``backfill``
+rebuilds all three from the orders collection with one aggregation; run it
+once after deploying, or whenever the rollups are suspected to have drifted:
+
+    python analytics.py --backfill
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+SUMMARY_ID = "all"
+PAID = "completed"
+ANALYTICS_EVENT_RETENTION_DAYS = int(os.environ.get("ANALYTICS_EVENT_RETENTION_DAYS", "7"))
+
+
+def order_day(created_at) -> str:
+    if isinstance(created_at, datetime):
+        return created_at.astimezone(timezone.utc).strftime("%Y-%m-%d")
+    return str(created_at)[:10]
+
+
+def status_value(status) -> str:
+    """Accept plain strings or the str-based status enums from server.py."""
+    return getattr(status, "value", status)
+
+
+def order_units(order: dict) -> int:
+    return sum(item["quantity"] for item in order.get("items", []))
+
+
+async def _apply_once(db, key: str, collection, _id, update: dict) -> None:
+    """Upsert ``update`` into ``collection[_id]`` unless ``key`` was already applied."""
+    try:
+        await db.analytics_applied.insert_one({"_id": key, "applied_at": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        return
+    try:
+        await collection.update_one({"_id": _id}, update, upsert=True)
+    except Exception:
+        # Let the retry apply it
+        await db.analytics_applied.delete_one({"_id": key})
+        raise
+
+
+async def record_order_created(db, order: dict, event_id: str):
+    day = order_day(order["created_at"])
+    await asyncio.gather(
+        _apply_once(db, f"{event_id}:summary", db.sales_summary, SUMMARY_ID, {"$inc": {
+            "orders": 1,
+            f"by_status.{status_value(order['order_status'])}": 1,
+            f"by_payment_status.{status_value(order['payment_status'])}": 1,
+        }}),
+        _apply_once(db, f"{event_id}:daily", db.sales_daily, day, {"$inc": {"orders": 1}}),
+    )
+
+
+async def record_order_paid(db, before: dict, order_status: str, event_id: str):
+    """Account for ``before`` (the order as it was prior to payment) becoming paid."""
+    units = order_units(before)
+    old_status, order_status = status_value(before["order_status"]), status_value(order_status)
+    summary_inc = {
+        "paid_orders": 1,
+        "revenue": before["total"],
+        "units": units,
+        f"by_payment_status.{status_value(before['payment_status'])}": -1,
+        f"by_payment_status.{PAID}": 1,
+    }
+    if old_status != order_status:
+        summary_inc[f"by_status.{old_status}"] = -1
+        summary_inc[f"by_status.{order_status}"] = 1
+
+    # One write per product (an order may hold several sizes of one product)
+    products = {}
+    for item in before.get("items", []):
+        product = products.setdefault(item["product_id"], {"units": 0, "revenue": 0, "name": item["product_name"]})
+        product["units"] += item["quantity"]
+        product["revenue"] += item["price"] * item["quantity"]
+    writes = [
+        _apply_once(db, f"{event_id}:summary", db.sales_summary, SUMMARY_ID, {"$inc": summary_inc}),
+        _apply_once(db, f"{event_id}:daily", db.sales_daily, order_day(before["created_at"]),
+                    {"$inc": {"paid_orders": 1, "revenue": before["total"], "units": units}}),
+    ]
+    for product_id, product in products.items():
+        writes.append(_apply_once(
+            db, f"{event_id}:product:{product_id}", db.sales_products, product_id,
+            {"$inc": {"units": product["units"], "revenue": product["revenue"]}, "$set": {"name": product["name"]}},
+        ))
+    await asyncio.gather(*writes)
+
+
+async def record_payment_status_change(db, old: str, new: str, event_id: str):
+    old, new = status_value(old), status_value(new)
+    if old != new:
+        await _apply_once(db, f"{event_id}:summary", db.sales_summary, SUMMARY_ID, {"$inc": {
+            f"by_payment_status.{old}": -1,
+            f"by_payment_status.{new}": 1,
+        }})
+
+
+async def record_order_status_change(db, old: str, new: str, event_id: str):
+    old, new = status_value(old), status_value(new)
+    if old != new:
+        await _apply_once(db, f"{event_id}:summary", db.sales_summary, SUMMARY_ID, {"$inc": {
+            f"by_status.{old}": -1,
+            f"by_status.{new}": 1,
+        }})
+
+
+async def get_dashboard(db, days: int = 30, top: int = 10) -> dict:
+    since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    summary, daily, top_products = await asyncio.gather(
+        db.sales_summary.find_one({"_id": SUMMARY_ID}),
+        db.sales_daily.find({"_id": {"$gte": since}}).sort("_id", 1).to_list(days),
+        db.sales_products.find().sort("units", DESCENDING).limit(top).to_list(top),
+    )
+    summary = summary or {}
+    paid_orders = summary.get("paid_orders", 0)
+    revenue = summary.get("revenue", 0)
+    return {
+        "summary": {
+            "orders": summary.get("orders", 0),
+            "paid_orders": paid_orders,
+            "revenue": revenue,
+            "units": summary.get("units", 0),
+            "average_order_value": round(revenue / paid_orders, 2) if paid_orders else 0,
+            "by_status": summary.get("by_status", {}),
+            "by_payment_status": summary.get("by_payment_status", {}),
+        },
+        "daily": [
+            {"date": d["_id"], "orders": d.get("orders", 0), "paid_orders": d.get("paid_orders", 0),
+             "revenue": d.get("revenue", 0), "units": d.get("units", 0)}
+            for d in daily
+        ],
+        "top_products": [
+            {"product_id": p["_id"], "name": p.get("name"), "units": p.get("units", 0),
+             "revenue": p.get("revenue", 0)}
+            for p in top_products
+        ],
+    }
+
+
+BACKFILL_PIPELINE = [
+    {"$facet": {
+        "by_status": [{"$group": {"_id": "$order_status", "n": {"$sum": 1}}}],
+        "by_payment_status": [{"$group": {"_id": "$payment_status", "n": {"$sum": 1}}}],
+        "daily": [{"$group": {
+            # Works for ISO strings and BSON dates alike
+            "_id": {"$substrBytes": [{"$toString": "$created_at"}, 0, 10]},
+            "orders": {"$sum": 1},
+            "paid_orders": {"$sum": {"$cond": [{"$eq": ["$payment_status", PAID]}, 1, 0]}},
+            "revenue": {"$sum": {"$cond": [{"$eq": ["$payment_status", PAID]}, "$total", 0]}},
+            "units": {"$sum": {"$cond": [{"$eq": ["$payment_status", PAID]}, {"$sum": "$items.quantity"}, 0]}},
+        }}],
+        "products": [
+            {"$match": {"payment_status": PAID}},
+            {"$unwind": "$items"},
+            {"$group": {
+                "_id": "$items.product_id",
+                "name": {"$last": "$items.product_name"},
+                "units": {"$sum": "$items.quantity"},
+                "revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}},
+            }},
+        ],
+    }},
+]
+
+
+async def backfill(db) -> dict:
+    """Rebuild every rollup from the orders collection. Run while order traffic is quiet."""
+    result = (await db.orders.aggregate(BACKFILL_PIPELINE).to_list(1))[0]
+    daily = result["daily"]
+    summary = {
+        "orders": sum(d["orders"] for d in daily),
+        "paid_orders": sum(d["paid_orders"] for d in daily),
+        "revenue": sum(d["revenue"] for d in daily),
+        "units": sum(d["units"] for d in daily),
+        "by_status": {s["_id"]: s["n"] for s in result["by_status"]},
+        "by_payment_status": {s["_id"]: s["n"] for s in result["by_payment_status"]},
+    }
+    await db.sales_summary.replace_one({"_id": SUMMARY_ID}, summary, upsert=True)
+    await db.sales_daily.delete_many({})
+    if daily:
+        await db.sales_daily.insert_many(daily)
+    await db.sales_products.delete_many({})
+    if result["products"]:
+        await db.sales_products.insert_many(result["products"])
+    return {"days": len(daily), "products": len(result["products"]), **summary}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Maintain the admin sales rollups.")
+    parser.add_argument("--backfill", action="store_true", help="rebuild all rollups from the orders collection")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.backfill:
+            stats = await backfill(db)
+            print(f"Rebuilt rollups: {stats['orders']} orders over {stats['days']} days, "
+                  f"{stats['products']} products, revenue {stats['revenue']}")
+        else:
+            print(await get_dashboard(db))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
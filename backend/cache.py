@@ -0,0 +1,95 @@
+"""Small in-process caches used by the API server.
+
+Each uvicorn worker keeps its own copy, so entries carry a TTL that bounds
+how long a worker can serve data written through a different worker.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Size-bounded LRU mapping whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def discard_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose value matches ``predicate``; O(n), for rare writes."""
+        stale = [key for key, (_, value) in self._data.items() if predicate(value)]
+        for key in stale:
+            del self._data[key]
+        return len(stale)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CatalogCache(TTLCache):
+    """TTL cache for catalog reads, invalidated wholesale by catalog writes.
+
+    Keys embed the catalog version current when the read *started*, so a
+    read that races with a write can never repopulate the cache with data
+    from before the write.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 60.0):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.version = 0
+
+    def key(self, *parts: Hashable) -> Tuple[Hashable, ...]:
+        return (self.version,) + parts
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self.clear()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["version"] = self.version
+        return stats
@@ -0,0 +1,216 @@
+"""Coupon rules, validation and redemption.
+
+A coupon document looks like::
+
+    {"code": "FESTIVE20", "active": true,
+     "discount_percent": 20, "max_discount": 500,   # or "discount_amount": 250 (flat)
+     "min_order_value": 1000, "category_ids": ["cat-festive"],
+     "starts_at": ..., "expiry_date": ...,          # datetimes or ISO strings
+     "max_redemptions": 1000, "per_user_limit": 1,
+     "redemptions": 17}                             # maintained here
+
+Definitions are compiled once into a ``Coupon`` (a list of rule checks plus
+a discount function) and cached per worker for ``COUPON_CACHE_TTL_SECONDS``,
+unknown codes included, so validating a code costs at most one coupon
+lookup plus one per-user usage lookup.
+
+Redemption is atomic. The per-user count lives in ``coupon_redemptions``
+(one document per code and user) and is taken with a conditional upsert;
+the global count is a conditional ``$inc`` on the coupon. Either refusing
+undoes the other, so concurrent checkouts can't exceed a cap. ``release``
+hands a use back when the order's payment fails, it is cancelled or its
+stock hold expires.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+
+COUPON_CACHE_TTL_SECONDS = float(os.environ.get("COUPON_CACHE_TTL_SECONDS", "60"))
+
+_MISSING = object()
+_cache = TTLCache(maxsize=4096, ttl=COUPON_CACHE_TTL_SECONDS)
+
+
+class CouponError(Exception):
+    """The coupon can't be applied; the message is safe to show the shopper."""
+
+
+def normalize_code(code: str) -> str:
+    return code.strip().upper()
+
+
+def _timestamp(value) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class Quote:
+    def __init__(self, coupon: "Coupon", subtotal: float, eligible_subtotal: float, discount: float):
+        self.coupon, self.subtotal, self.eligible_subtotal, self.discount = coupon, subtotal, eligible_subtotal, discount
+
+
+# A rule returns the reason the coupon does not apply, or None
+Rule = Callable[[datetime, Optional[float], Optional[float]], Optional[str]]
+
+
+class Coupon:
+    def __init__(self, doc: dict):
+        self.code = normalize_code(doc["code"])
+        self.discount_percent: Optional[float] = doc.get("discount_percent")
+        self.discount_amount: Optional[float] = doc.get("discount_amount")
+        self.max_discount: Optional[float] = doc.get("max_discount")
+        self.min_order_value: float = doc.get("min_order_value") or 0
+        self.category_ids = frozenset(doc.get("category_ids") or ())
+        self.max_redemptions: Optional[int] = doc.get("max_redemptions")
+        self.per_user_limit: Optional[int] = doc.get("per_user_limit")
+        self.rules: List[Rule] = self._compile(doc)
+        # Rules that need a cart are skipped when only the code is checked
+        self.cart_rules: List[Rule] = self._compile_cart_rules()
+
+    @property
+    def discount_type(self) -> str:
+        return "percent" if self.discount_percent is not None else "flat"
+
+    def _compile(self, doc: dict) -> List[Rule]:
+        rules: List[Rule] = []
+        if not doc.get("active", True):
+            rules.append(lambda now, subtotal, eligible: "This coupon is no longer active")
+        if self.discount_percent is None and self.discount_amount is None:
+            rules.append(lambda now, subtotal, eligible: "This coupon has no discount")
+        starts_at, expires_at = _timestamp(doc.get("starts_at")), _timestamp(doc.get("expiry_date"))
+        if starts_at:
+            rules.append(lambda now, subtotal, eligible: "This coupon is not active yet" if now < starts_at else None)
+        if expires_at:
+            rules.append(lambda now, subtotal, eligible: "This coupon has expired" if now >= expires_at else None)
+        if self.max_redemptions is not None:
+            # Advisory here (the cached count lags); redeem() enforces the cap
+            used = doc.get("redemptions", 0)
+            rules.append(lambda now, subtotal, eligible:
+                         "This coupon has reached its usage limit" if used >= self.max_redemptions else None)
+        return rules
+
+    def _compile_cart_rules(self) -> List[Rule]:
+        rules: List[Rule] = []
+        if self.min_order_value:
+            minimum = self.min_order_value
+            rules.append(lambda now, subtotal, eligible:
+                         f"Minimum order value for this coupon is ₹{minimum:g}" if subtotal < minimum else None)
+        if self.category_ids:
+            rules.append(lambda now, subtotal, eligible:
+                         "This coupon does not apply to the items in your cart" if not eligible else None)
+        return rules
+
+    def discount_for(self, eligible_subtotal: float) -> float:
+        if self.discount_percent is not None:
+            discount = eligible_subtotal * self.discount_percent / 100
+            if self.max_discount is not None:
+                discount = min(discount, self.max_discount)
+        else:
+            discount = self.discount_amount
+        return round(min(discount, eligible_subtotal), 2)
+
+    def evaluate(self, lines: Optional[Iterable[dict]] = None, entries: Optional[Dict[str, dict]] = None,
+                 now: Optional[datetime] = None) -> Quote:
+        """Check every rule and price the discount for priced order ``lines``.
+
+        ``entries`` are the price book entries of the lines' products (their
+        ``category_id`` decides category scope). Without ``lines`` only the
+        rules that don't depend on a cart are checked. Raises ``CouponError``.
+        """
+        now = now or datetime.now(timezone.utc)
+        subtotal = eligible = None
+        rules = self.rules
+        if lines is not None:
+            subtotal = eligible = 0.0
+            for line in lines:
+                amount = line["price"] * line["quantity"]
+                subtotal += amount
+                if not self.category_ids or entries[line["product_id"]].get("category_id") in self.category_ids:
+                    eligible += amount
+            rules = rules + self.cart_rules
+        for rule in rules:
+            reason = rule(now, subtotal, eligible)
+            if reason:
+                raise CouponError(reason)
+        return Quote(self, subtotal or 0.0, eligible or 0.0, self.discount_for(eligible) if lines is not None else 0.0)
+
+
+async def get_coupon(db, code: str) -> Coupon:
+    """The compiled coupon for ``code``; raises ``CouponError`` if there is none."""
+    code = normalize_code(code)
+    coupon = _cache.get(code, _MISSING)
+    if coupon is _MISSING:
+        doc = await db.coupons.find_one({"code": code}, {"_id": 0})
+        coupon = Coupon(doc) if doc else None
+        _cache.set(code, coupon)
+    if coupon is None:
+        raise CouponError("Invalid coupon code")
+    return coupon
+
+
+def invalidate(code: Optional[str] = None) -> None:
+    if code is None:
+        _cache.clear()
+    else:
+        _cache.pop(normalize_code(code))
+
+
+def _usage_id(code: str, user_id: str) -> str:
+    return f"{code}:{user_id}"
+
+
+async def check_user_limit(db, coupon: Coupon, user_id: Optional[str]) -> None:
+    if not coupon.per_user_limit or not user_id:
+        return
+    usage = await db.coupon_redemptions.find_one({"_id": _usage_id(coupon.code, user_id)}, {"count": 1})
+    if usage and usage.get("count", 0) >= coupon.per_user_limit:
+        raise CouponError("You have already used this coupon")
+
+
+async def redeem(db, coupon: Coupon, user_id: str) -> None:
+    """Count one use for ``user_id``, atomically honouring both caps."""
+    usage = {"_id": _usage_id(coupon.code, user_id)}
+    if coupon.per_user_limit:
+        usage["count"] = {"$lt": coupon.per_user_limit}
+    try:
+        # At the cap the filter misses, and the upsert collides with the existing _id
+        await db.coupon_redemptions.update_one(
+            usage, {"$inc": {"count": 1}, "$setOnInsert": {"code": coupon.code, "user_id": user_id}}, upsert=True
+        )
+    except DuplicateKeyError:
+        raise CouponError("You have already used this coupon")
+
+    query = {"code": coupon.code}
+    if coupon.max_redemptions is not None:
+        query["redemptions"] = {"$not": {"$gte": coupon.max_redemptions}}
+    result = await db.coupons.update_one(query, {"$inc": {"redemptions": 1}})
+    if result.matched_count == 0:
+        await db.coupon_redemptions.update_one({"_id": usage["_id"]}, {"$inc": {"count": -1}})
+        invalidate(coupon.code)
+        raise CouponError("This coupon has reached its usage limit")
+
+
+async def record_use(db, code: str, user_id: str) -> None:
+    """Count a use without checking the caps, for an order paid after its use was released."""
+    code = normalize_code(code)
+    await db.coupon_redemptions.update_one(
+        {"_id": _usage_id(code, user_id)},
+        {"$inc": {"count": 1}, "$setOnInsert": {"code": code, "user_id": user_id}}, upsert=True,
+    )
+    await db.coupons.update_one({"code": code}, {"$inc": {"redemptions": 1}})
+
+
+async def release(db, code: str, user_id: str) -> None:
+    """Give back one use counted by ``redeem``."""
+    code = normalize_code(code)
+    await db.coupons.update_one({"code": code, "redemptions": {"$gt": 0}}, {"$inc": {"redemptions": -1}})
+    await db.coupon_redemptions.update_one(
+        {"_id": _usage_id(code, user_id), "count": {"$gt": 0}}, {"$inc": {"count": -1}}
+    )
@@ -0,0 +1,181 @@
+"""MongoDB client configuration, lifecycle and connection-pool metrics.
+
+Pool and driver options come from the environment so each deployment can
+size them against its uvicorn worker count (every worker owns a pool of up
+to ``MONGO_MAX_POOL_SIZE`` connections per server):
+
+    MONGO_MAX_POOL_SIZE=100              MONGO_MIN_POOL_SIZE=0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS=         (unset: wait for a connection indefinitely)
+    MONGO_MAX_IDLE_TIME_MS=              MONGO_SERVER_SELECTION_TIMEOUT_MS=30000
+    MONGO_COMPRESSORS=                   (e.g. "zstd,snappy,zlib"; needs server support)
+    MONGO_CATALOG_READ_PREFERENCE=primary
+    MONGO_WARM_CONNECTIONS=4             (opened at startup; 0 skips warm-up)
+
+``catalog_db`` is the same database with ``MONGO_CATALOG_READ_PREFERENCE``
+applied; only catalog reads use it, so with ``secondaryPreferred`` they move
+off the primary. Data read there can lag the primary by the replication
+delay, on top of the catalog cache TTL.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+from metrics import LATENCY_BUCKETS, REGISTRY, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+def _int_env(name: str) -> Optional[int]:
+    value = os.environ.get(name, "").strip()
+    return int(value) if value else None
+
+
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+        "waitQueueTimeoutMS": _int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "maxIdleTimeMS": _int_env("MONGO_MAX_IDLE_TIME_MS"),
+        "compressors": os.environ.get("MONGO_COMPRESSORS", "").strip() or None,
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks, per server, open and checked-out connections and waiters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open: Dict[str, int] = defaultdict(int)
+        self.in_use: Dict[str, int] = defaultdict(int)
+        self.waiting: Dict[str, int] = defaultdict(int)
+        self.max_size: Dict[str, int] = {}
+        self._wait_started = threading.local()
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _add(self, counts: Dict[str, int], event, delta: int) -> None:
+        with self.lock:
+            counts[self._address(event)] += delta
+
+    def pool_created(self, event):
+        with self.lock:
+            self.max_size[self._address(event)] = event.options.get("maxPoolSize", 100)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        POOL_CLEARED.inc(address=self._address(event))
+
+    def pool_closed(self, event):
+        address = self._address(event)
+        with self.lock:
+            for counts in (self.open, self.in_use, self.waiting, self.max_size):
+                counts.pop(address, None)
+
+    def connection_created(self, event):
+        self._add(self.open, event, 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(self.open, event, -1)
+
+    def connection_check_out_started(self, event):
+        # Started and finished fire on the same thread, so the wait is timed per thread
+        self._wait_started.value = time.perf_counter()
+        self._add(self.waiting, event, 1)
+
+    def _check_out_finished(self, event):
+        self._add(self.waiting, event, -1)
+        started = getattr(self._wait_started, "value", None)
+        if started is not None:
+            CHECKOUT_WAIT.observe(time.perf_counter() - started, address=self._address(event))
+            self._wait_started.value = None
+
+    def connection_check_out_failed(self, event):
+        self._check_out_finished(event)
+        CHECKOUT_FAILURES.inc(address=self._address(event), reason=str(event.reason))
+
+    def connection_checked_out(self, event):
+        self._check_out_finished(event)
+        self._add(self.in_use, event, 1)
+
+    def connection_checked_in(self, event):
+        self._add(self.in_use, event, -1)
+
+    def gauge(self, counts: Dict[str, int]):
+        def collect():
+            with self.lock:
+                return {(("address", address),): value for address, value in counts.items()}
+        return collect
+
+
+pool_monitor = PoolMonitor()
+REGISTRY.register(Gauge("mongo_pool_connections", "Open pooled connections.", pool_monitor.gauge(pool_monitor.open)))
+REGISTRY.register(Gauge("mongo_pool_in_use", "Checked-out pooled connections.", pool_monitor.gauge(pool_monitor.in_use)))
+REGISTRY.register(Gauge("mongo_pool_waiting", "Operations waiting for a pooled connection.",
+                        pool_monitor.gauge(pool_monitor.waiting)))
+REGISTRY.register(Gauge("mongo_pool_max_size", "maxPoolSize per server.", pool_monitor.gauge(pool_monitor.max_size)))
+CHECKOUT_WAIT = REGISTRY.register(Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting to check out a connection.", LATENCY_BUCKETS))
+CHECKOUT_FAILURES = REGISTRY.register(Counter(
+    "mongo_pool_checkout_failures_total", "Connection check-outs that failed, by reason."))
+POOL_CLEARED = REGISTRY.register(Counter(
+    "mongo_pool_cleared_total", "Times a server's pool was cleared after an error."))
+
+
+class Database:
+    """The API's Motor client and database handles.
+
+    Building it does no I/O; ``connect`` warms the pool during startup and
+    ``close`` releases it at shutdown.
+    """
+
+    def __init__(self, url: str, name: str, event_listeners=()):
+        self.options = client_options()
+        # tz_aware: timestamps are stored as BSON dates and read back as aware UTC datetimes
+        self.client = AsyncIOMotorClient(
+            url, tz_aware=True, event_listeners=[pool_monitor, *event_listeners], **self.options
+        )
+        self.db = self.client[name]
+        mode = os.environ.get("MONGO_CATALOG_READ_PREFERENCE", "primary")
+        read_preference = make_read_preference(read_pref_mode_from_name(mode), tag_sets=None)
+        self.catalog_db = self.client.get_database(name, read_preference=read_preference)
+
+    async def connect(self, warm_connections: Optional[int] = None) -> None:
+        if warm_connections is None:
+            warm_connections = int(os.environ.get("MONGO_WARM_CONNECTIONS", "4"))
+        if warm_connections <= 0:
+            return
+        warm_connections = min(warm_connections, self.options["maxPoolSize"])
+        start = time.perf_counter()
+        try:
+            # Concurrent pings force that many connections open (and authenticated)
+            await asyncio.gather(*(self.db.command("ping") for _ in range(warm_connections)))
+            if self.catalog_db.read_preference != self.db.read_preference:
+                await self.catalog_db.command("ping", read_preference=self.catalog_db.read_preference)
+        except PyMongoError as e:
+            # Requests will connect on demand; don't keep the worker from starting
+            logger.warning("MongoDB pool warm-up failed: %s", e)
+            return
+        logger.info("MongoDB pool warmed: %d connections in %.0f ms", warm_connections,
+                    (time.perf_counter() - start) * 1000)
+
+    def close(self) -> None:
+        self.client.close()
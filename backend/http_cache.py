@@ -0,0 +1,79 @@
+"""HTTP conditional caching for the public catalog routes.
+
+Bodies are rendered once and tagged with a strong ETag (a hash of the
+exact bytes sent), so a client or CDN holding a copy can revalidate with
+``If-None-Match`` and get an empty 304 instead of the product JSON again.
+Routes that keep rendered bodies in the catalog cache pay for
+serialisation and hashing once per catalog version, not once per request.
+"""
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from lean import dumps
+
+
+class RenderedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def cache_control(max_age: int, stale_while_revalidate: int) -> str:
+    return f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+
+
+# Per-route freshness: categories barely change, reviews change most often.
+CATEGORIES_CACHE = cache_control(300, 3600)
+PRODUCT_LIST_CACHE = cache_control(60, 300)
+PRODUCT_CACHE = cache_control(120, 600)
+SEARCH_CACHE = cache_control(60, 300)
+REVIEWS_CACHE = cache_control(30, 120)
+
+
+@lru_cache(maxsize=None)
+def _adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def render_json(content: Any, model: Optional[Any] = None) -> RenderedBody:
+    """Serialise ``content`` and tag it.
+
+    With ``model`` the content is validated and dumped like a FastAPI
+    ``response_model``; without it the content must already be
+    schema-shaped (see ``lean.lean_projection``) and goes through orjson.
+    """
+    if model is None:
+        body = dumps(content)
+    else:
+        adapter = _adapter(model)
+        body = adapter.dump_json(adapter.validate_python(content))
+    return RenderedBody(body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 prescribes for ``If-None-Match``."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+
+
+def conditional_response(
+    request: Request,
+    rendered: RenderedBody,
+    cache_policy: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    headers = {"ETag": rendered.etag, "Cache-Control": cache_policy, **(headers or {})}
+    if etag_matches(request.headers.get("if-none-match"), rendered.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(rendered.body, media_type="application/json", headers=headers)
@@ -0,0 +1,192 @@
+"""Streaming, idempotent catalog import from CSV or JSONL.
+
+Rows are validated against ``ProductCreate`` and upserted by slug in
+batched ``bulk_write`` calls, so re-running an import updates products in
+place while the shop keeps serving. Existing ids and ``created_at`` are
+preserved; a row may carry an ``id`` column to choose the id of a new
+product. ``--prune`` then removes products the import did not touch,
+including any left over in the legacy seed schema.
+
+    python import_catalog.py products.csv
+    python import_catalog.py products.jsonl --categories categories.jsonl --prune
+    python import_catalog.py products.csv --dry-run
+
+In CSV files the list columns (``images``, ``sizes``, ``colors``) are
+``|``-separated and empty cells mean "use the default". Running API
+workers pick the changes up within ``CATALOG_CACHE_TTL_SECONDS``.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models import CategoryCreate, ProductCreate
+from ratings import initial_aggregates
+from search import name_key
+
+load_dotenv(Path(__file__).parent / '.env')
+
+BATCH_SIZE = 1000
+LIST_FIELDS = ("images", "sizes", "colors")
+
+
+def read_rows(path: Path, fmt: Optional[str] = None) -> Iterator[Tuple[int, dict]]:
+    """Yield ``(line_number, row)`` without loading the whole file."""
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    with path.open(newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, {
+                    key: value.split("|") if key in LIST_FIELDS else value
+                    for key, value in row.items() if value not in (None, "")
+                }
+        else:
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError as e:
+                        yield line, {"__error__": f"invalid JSON: {e}"}
+
+
+def product_upsert(product: ProductCreate, row: dict, run_id: str, now: datetime) -> UpdateOne:
+    fields = product.model_dump()
+    fields.update({"in_stock": product.stock_quantity > 0, "name_key": name_key(product.name),
+                   "updated_at": now, "import_run": run_id})
+    return UpdateOne(
+        {"slug": product.slug},
+        {
+            "$set": fields,
+            "$setOnInsert": {"id": str(row.get("id") or uuid.uuid4()), "created_at": now, **initial_aggregates()},
+            # Documents written by the old seed script used these names
+            "$unset": {"stock": "", "category": ""},
+        },
+        upsert=True,
+    )
+
+
+class ImportStats:
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.rows = self.inserted = self.updated = self.invalid = self.failed = 0
+        self.started = time.perf_counter()
+
+    def line(self) -> str:
+        rate = self.rows / max(time.perf_counter() - self.started, 1e-9)
+        return (f"{self.rows} rows: {self.inserted} new, {self.updated} updated, "
+                f"{self.invalid} invalid, {self.failed} failed ({rate:.0f} rows/s)")
+
+
+async def _flush(collection, batch: List[UpdateOne], stats: ImportStats, dry_run: bool) -> None:
+    if not batch or dry_run:
+        return
+    try:
+        result = await collection.bulk_write(batch, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        stats.failed += len(details["writeErrors"])
+        for error in details["writeErrors"][:5]:
+            print(f"  write error: {error['errmsg']}", file=sys.stderr)
+    stats.inserted += len(details.get("upserted", []))
+    stats.updated += details.get("nMatched", 0)
+
+
+async def import_products(db, rows: Iterable[Tuple[int, dict]], batch_size: int = BATCH_SIZE,
+                          dry_run: bool = False, progress: bool = True, run_id: Optional[str] = None) -> ImportStats:
+    stats = ImportStats(run_id or uuid.uuid4().hex)
+    batch, slugs = [], {}
+    now = datetime.now(timezone.utc)
+    for line, row in rows:
+        stats.rows += 1
+        if "__error__" in row:
+            stats.invalid += 1
+            print(f"  line {line}: {row['__error__']}", file=sys.stderr)
+            continue
+        try:
+            product = ProductCreate.model_validate(row)
+        except ValidationError as e:
+            stats.invalid += 1
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            print(f"  line {line}: {errors}", file=sys.stderr)
+            continue
+        # Within one unordered batch the same slug twice could race two upserts; keep the last row
+        if product.slug in slugs:
+            batch[slugs[product.slug]] = product_upsert(product, row, stats.run_id, now)
+            continue
+        slugs[product.slug] = len(batch)
+        batch.append(product_upsert(product, row, stats.run_id, now))
+        if len(batch) >= batch_size:
+            await _flush(db.products, batch, stats, dry_run)
+            batch, slugs = [], {}
+            if progress:
+                print(stats.line(), file=sys.stderr)
+    await _flush(db.products, batch, stats, dry_run)
+    return stats
+
+
+async def upsert_categories(db, rows: Iterable[dict]) -> int:
+    requests = []
+    for row in rows:
+        category = CategoryCreate.model_validate(row)
+        requests.append(UpdateOne(
+            {"slug": category.slug},
+            {"$set": category.model_dump(), "$setOnInsert": {"id": str(row.get("id") or uuid.uuid4())}},
+            upsert=True,
+        ))
+    if requests:
+        await db.categories.bulk_write(requests, ordered=False)
+    return len(requests)
+
+
+async def prune_products(db, run_id: str) -> int:
+    """Delete products that the import ``run_id`` did not write."""
+    result = await db.products.delete_many({"import_run": {"$ne": run_id}})
+    return result.deleted_count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Upsert products (and categories) from CSV or JSONL.")
+    parser.add_argument("products", type=Path, help="products file (.csv or .jsonl)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="override detection from the file extension")
+    parser.add_argument("--categories", type=Path, help="categories file, upserted by slug first")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--prune", action="store_true", help="delete products not present in this import")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.categories and not args.dry_run:
+            count = await upsert_categories(db, (row for _, row in read_rows(args.categories)))
+            print(f"categories: {count} upserted")
+        stats = await import_products(db, read_rows(args.products, args.format),
+                                      batch_size=args.batch_size, dry_run=args.dry_run)
+        print(("validated " if args.dry_run else "imported ") + stats.line())
+        if args.prune:
+            if stats.invalid or stats.failed or args.dry_run:
+                print("not pruning: the import was incomplete or a dry run")
+            else:
+                print(f"pruned {await prune_products(db, stats.run_id)} products not in this import")
+    finally:
+        client.close()
+    if stats.invalid or stats.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""Declarative MongoDB index spec and an idempotent bootstrapper.
+
+Run at API startup, or by hand to inspect drift without touching anything:
+
+    python indexes.py --check
+"""
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from analytics import ANALYTICS_EVENT_RETENTION_DAYS
+from inventory import RESERVATION_RETENTION_DAYS
+from jobs import JOB_OUTBOX_RETENTION_DAYS
+from search import FIELD_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+# Every query shape server.py issues, keyed by collection. Index names are
+# part of the spec so drift can be reported by name.
+INDEX_SPEC: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("phone", ASCENDING)], name="phone"),
+    ],
+    "categories": [
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Legacy seed documents have no slug, so uniqueness only covers real ones.
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True,
+                   partialFilterExpression={"slug": {"$type": "string"}}),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="newest"),
+        IndexModel([("category_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="category_newest"),
+        IndexModel([("featured", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="featured_newest"),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)], name="name_id"),
+        # Autocomplete: range scans on the normalized name
+        IndexModel([("name_key", ASCENDING), ("id", ASCENDING)], name="name_key_id"),
+        IndexModel([("rating_avg", DESCENDING), ("rating_count", DESCENDING), ("id", DESCENDING)],
+                   name="top_rated"),
+        IndexModel([("category_id", ASCENDING), ("rating_avg", DESCENDING), ("rating_count", DESCENDING),
+                    ("id", DESCENDING)], name="category_top_rated"),
+        IndexModel([(field, TEXT) for field in FIELD_WEIGHTS], name="search_text",
+                   weights=FIELD_WEIGHTS, default_language="english"),
+    ],
+    "coupons": [
+        IndexModel([("code", ASCENDING)], name="code_unique", unique=True),
+    ],
+    "carts": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "wishlists": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "reviews": [
+        IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="product_newest_id"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_newest"),
+        # Admin listing: keyset on (created_at, id), optionally filtered by status
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="newest_id"),
+        IndexModel([("order_status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="status_newest"),
+        IndexModel([("payment_status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="payment_status_newest"),
+    ],
+    "stock_reservations": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        # Sweeper: held reservations past their expiry
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], name="status_expires"),
+        IndexModel([("closed_at", ASCENDING)], name="closed_ttl",
+                   expireAfterSeconds=RESERVATION_RETENTION_DAYS * 86400),
+    ],
+    "job_outbox": [
+        # Recovery: pending jobs whose lease ran out
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+        IndexModel([("finished_at", ASCENDING)], name="finished_ttl",
+                   expireAfterSeconds=JOB_OUTBOX_RETENTION_DAYS * 86400),
+    ],
+    "analytics_applied": [
+        IndexModel([("applied_at", ASCENDING)], name="applied_ttl",
+                   expireAfterSeconds=ANALYTICS_EVENT_RETENTION_DAYS * 86400),
+    ],
+    "sales_products": [
+        IndexModel([("units", DESCENDING)], name="units"),
+    ],
+}
+
+
+async def ensure_indexes(db, create: bool = True) -> Dict[str, Dict[str, List[str]]]:
+    """Create any missing spec indexes and report drift per collection.
+
+    Returns ``{collection: {"missing", "created", "failed", "extra"}}`` where
+    ``missing`` is what the collection lacked before this run and ``extra``
+    lists indexes present in the database but absent from the spec.
+    """
+    report = {}
+    for collection, models in INDEX_SPEC.items():
+        existing = await db[collection].index_information()
+        wanted = {model.document["name"]: model for model in models}
+        result = {
+            "missing": [name for name in wanted if name not in existing],
+            "created": [],
+            "failed": [],
+            "extra": sorted(name for name in existing if name != "_id_" and name not in wanted),
+        }
+        if create:
+            for name in result["missing"]:
+                try:
+                    await db[collection].create_indexes([wanted[name]])
+                    result["created"].append(name)
+                except OperationFailure as e:
+                    logger.error("Could not create index %s.%s: %s", collection, name, e)
+                    result["failed"].append(name)
+        report[collection] = result
+    return report
+
+
+def log_index_report(report: Dict[str, Dict[str, List[str]]]) -> None:
+    for collection, result in report.items():
+        if result["created"]:
+            logger.info("Created indexes on %s: %s", collection, ", ".join(result["created"]))
+        if result["failed"]:
+            logger.warning("Missing indexes on %s: %s", collection, ", ".join(result["failed"]))
+        if result["extra"]:
+            logger.warning("Indexes on %s not in spec: %s", collection, ", ".join(result["extra"]))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Create or check the MongoDB indexes the API relies on.")
+    parser.add_argument("--check", action="store_true", help="only report drift, do not create anything")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        report = await ensure_indexes(client[os.environ['DB_NAME']], create=not args.check)
+    finally:
+        client.close()
+
+    for collection, result in report.items():
+        print(f"{collection}:")
+        for key in ("missing", "created", "failed", "extra"):
+            if result[key]:
+                print(f"  {key}: {', '.join(result[key])}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,202 @@
+"""Stock reservations for checkout.
+
+``reserve`` takes an order's quantities off ``products.stock_quantity`` with
+one conditional ``$inc`` per product (matched only while enough stock is
+left), so concurrent checkouts can never push stock below zero. The
+taken lines are recorded in ``stock_reservations``:
+
+* ``held``      – taken at order creation, waiting for payment;
+* ``committed`` – payment verified (or the order was placed without an
+  online payment), the stock is sold;
+* ``expired`` / ``released`` – handed back to ``stock_quantity``.
+
+A held reservation expires ``RESERVATION_TTL_SECONDS`` after the order is
+created; ``sweep_expired`` (run periodically by the API) returns its stock.
+Every transition is a single conditional update on the reservation, so
+several workers can sweep, verify and cancel at once and stock is handed
+back exactly once. Closed reservations are removed by a TTL index after
+``RESERVATION_RETENTION_DAYS``.
+
+Stock is tracked per product; the size and colour of each line are kept
+on the reservation for reconciliation.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_TTL_SECONDS = int(os.environ.get("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_SECONDS = float(os.environ.get("RESERVATION_SWEEP_SECONDS", "60"))
+RESERVATION_RETENTION_DAYS = int(os.environ.get("RESERVATION_RETENTION_DAYS", "30"))
+
+HELD = "held"
+COMMITTED = "committed"
+EXPIRED = "expired"
+RELEASED = "released"
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id: str, requested: int, available: Optional[int]):
+        self.product_id, self.requested, self.available = product_id, requested, available
+        super().__init__(f"{product_id}: requested {requested}, available {available}")
+
+
+def reservation_lines(items: Iterable) -> List[dict]:
+    """Order items (models or dicts) as ``{product_id, size, color, quantity}`` lines."""
+    lines = []
+    for item in items:
+        item = item if isinstance(item, dict) else item.model_dump()
+        lines.append({key: item.get(key) for key in ("product_id", "size", "color", "quantity")})
+    return lines
+
+
+def _per_product(lines: List[dict]) -> Dict[str, int]:
+    totals: Dict[str, int] = defaultdict(int)
+    for line in lines:
+        totals[line["product_id"]] += line["quantity"]
+    # A fixed order keeps two carts from each holding what the other needs
+    return dict(sorted(totals.items()))
+
+
+async def _take(products, product_id: str, quantity: int) -> Optional[int]:
+    """Decrement stock if at least ``quantity`` is left; returns what remains, or None."""
+    before = await products.find_one_and_update(
+        {"id": product_id, "stock_quantity": {"$gte": quantity}},
+        {"$inc": {"stock_quantity": -quantity}},
+        projection={"_id": 0, "stock_quantity": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        return None
+    remaining = before["stock_quantity"] - quantity
+    if remaining == 0:
+        await products.update_one({"id": product_id, "stock_quantity": 0}, {"$set": {"in_stock": False}})
+    return remaining
+
+
+async def _restock(products, totals: Dict[str, int]) -> None:
+    for product_id, quantity in totals.items():
+        await products.update_one({"id": product_id}, {"$inc": {"stock_quantity": quantity}})
+        await products.update_one(
+            {"id": product_id, "in_stock": False, "stock_quantity": {"$gt": 0}}, {"$set": {"in_stock": True}}
+        )
+
+
+async def take_stock(db, lines: List[dict]) -> bool:
+    """Take every line or nothing. Returns True if a product sold out."""
+    taken: Dict[str, int] = {}
+    sold_out = False
+    for product_id, quantity in _per_product(lines).items():
+        remaining = await _take(db.products, product_id, quantity)
+        if remaining is None:
+            await _restock(db.products, taken)
+            product = await db.products.find_one({"id": product_id}, {"_id": 0, "stock_quantity": 1})
+            raise OutOfStock(product_id, quantity, product.get("stock_quantity", 0) if product else None)
+        taken[product_id] = quantity
+        sold_out = sold_out or remaining == 0
+    return sold_out
+
+
+async def reserve(db, order_id: str, items: Iterable, now: Optional[datetime] = None) -> bool:
+    """Hold stock for a new order; raises ``OutOfStock`` and holds nothing if any line is short.
+
+    Returns True if the order sold a product out (its ``in_stock`` flipped).
+    """
+    now = now or datetime.now(timezone.utc)
+    lines = reservation_lines(items)
+    sold_out = await take_stock(db, lines)
+    # Stock is taken before the reservation exists: a crash in between can only
+    # under-sell (the stock stays taken), never oversell.
+    await db.stock_reservations.insert_one({
+        "order_id": order_id,
+        "lines": lines,
+        "status": HELD,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=RESERVATION_TTL_SECONDS),
+    })
+    return sold_out
+
+
+async def _close(db, order_id: str, from_statuses: List[str], status: str) -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.stock_reservations.find_one_and_update(
+        {"order_id": order_id, "status": {"$in": from_statuses}},
+        {"$set": {"status": status, "closed_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
+    )
+
+
+async def commit(db, order_id: str) -> bool:
+    """Mark the order's stock as sold once payment is verified.
+
+    If the hold already expired, or was released (an earlier verification
+    failed, or the order was cancelled), the stock is taken again; returns
+    False (and logs) when it is no longer there, so the paid order can be
+    followed up by hand.
+    """
+    if await _close(db, order_id, [HELD], COMMITTED):
+        return True
+    lapsed = await _close(db, order_id, [EXPIRED, RELEASED], COMMITTED)
+    if lapsed is None:
+        return True  # already committed, or the order predates reservations
+    try:
+        await take_stock(db, lapsed["lines"])
+    except OutOfStock as e:
+        # Not taken, so a later release must not hand it back
+        await db.stock_reservations.update_one(
+            {"order_id": order_id, "status": COMMITTED}, {"$set": {"status": lapsed["status"]}}
+        )
+        logger.warning("Paid order %s could not re-take its released stock: %s", order_id, e)
+        return False
+    return True
+
+
+async def release(db, order_id: str, include_committed: bool = False) -> bool:
+    """Hand an order's stock back (payment failed, or the order was cancelled)."""
+    statuses = [HELD, COMMITTED] if include_committed else [HELD]
+    before = await _close(db, order_id, statuses, RELEASED)
+    if before is None:
+        return False
+    await _restock(db.products, _per_product(before["lines"]))
+    return True
+
+
+async def sweep_expired(db, now: Optional[datetime] = None, limit: int = 500, on_expired=None) -> int:
+    """Return the stock of held reservations past ``expires_at``.
+
+    ``on_expired(order_id)`` is awaited for each one, after its stock is back.
+    """
+    now = now or datetime.now(timezone.utc)
+    expired = 0
+    due = db.stock_reservations.find(
+        {"status": HELD, "expires_at": {"$lte": now}}, {"_id": 0, "order_id": 1}
+    ).limit(limit)
+    async for reservation in due:
+        # Claimed by the conditional status change, so each is restocked once
+        before = await _close(db, reservation["order_id"], [HELD], EXPIRED)
+        if before:
+            await _restock(db.products, _per_product(before["lines"]))
+            expired += 1
+            if on_expired:
+                await on_expired(reservation["order_id"])
+    return expired
+
+
+async def run_sweeper(db, interval: float = RESERVATION_SWEEP_SECONDS, on_sweep=None, on_expired=None) -> None:
+    while True:
+        try:
+            expired = await sweep_expired(db, on_expired=on_expired)
+            if expired:
+                logger.info("Released stock of %d expired reservations", expired)
+                if on_sweep:
+                    on_sweep(expired)
+        except Exception:
+            logger.exception("Reservation sweep failed")
+        await asyncio.sleep(interval)
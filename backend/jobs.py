@@ -0,0 +1,229 @@
+"""In-process background jobs for side effects that can run after the response.
+
+Routes ``enqueue`` a named job and return; ``JOB_CONCURRENCY`` worker tasks
+run the registered handlers. A failing job is retried up to
+``JOB_MAX_ATTEMPTS`` times with exponential backoff and jitter (starting at
+``JOB_RETRY_BASE_SECONDS``) without holding a worker while it waits.
+Delivery is at least once, so handlers should tolerate a repeat.
+
+With ``JOB_OUTBOX=1`` every job is first written to the ``job_outbox``
+collection and marked done or dead there, so jobs survive a crash or
+restart. Each pending job is leased to the worker that queued it; jobs
+whose lease ran out (their worker stopped or died) are claimed by the next
+worker that starts or by the periodic recovery of a running one.
+
+``drain`` (called at shutdown) stops intake and waits up to
+``JOB_DRAIN_TIMEOUT_SECONDS`` for queued, running and retrying jobs to
+finish. Jobs still unfinished after that are lost unless the outbox is on.
+Finished outbox entries are removed by a TTL index after
+``JOB_OUTBOX_RETENTION_DAYS``.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import LATENCY_BUCKETS, REGISTRY, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get("JOB_RETRY_BASE_SECONDS", "0.5"))
+JOB_RETRY_MAX_SECONDS = float(os.environ.get("JOB_RETRY_MAX_SECONDS", "60"))
+JOB_DRAIN_TIMEOUT_SECONDS = float(os.environ.get("JOB_DRAIN_TIMEOUT_SECONDS", "10"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "300"))
+JOB_OUTBOX_RETENTION_DAYS = int(os.environ.get("JOB_OUTBOX_RETENTION_DAYS", "7"))
+
+PENDING, DONE, DEAD = "pending", "done", "dead"
+
+JOBS = REGISTRY.register(Counter("background_jobs_total", "Background job attempts by job and outcome."))
+JOB_DURATION = REGISTRY.register(Histogram(
+    "background_job_duration_seconds", "Background job run time per attempt.", LATENCY_BUCKETS))
+
+# Live queues; one gauge covers them all
+_queues: "weakref.WeakSet[JobQueue]" = weakref.WeakSet()
+REGISTRY.register(Gauge("background_jobs_unfinished", "Queued, running and retrying background jobs.",
+                        lambda: {(): sum(queue._unfinished for queue in _queues)}))
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class Job:
+    __slots__ = ("id", "name", "payload", "attempts")
+
+    def __init__(self, name: str, payload: dict, id: Optional[str] = None, attempts: int = 0):
+        self.id = id or uuid.uuid4().hex
+        self.name, self.payload, self.attempts = name, payload, attempts
+
+
+class JobQueue:
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 maxsize: int = 10_000, outbox=None):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.outbox = outbox
+        self.handlers: Dict[str, Handler] = {}
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=maxsize)
+        self._workers = []
+        self._retries = set()
+        self._unfinished = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._accepting = False
+        _queues.add(self)
+
+    def handler(self, name: str):
+        """Register the decorated coroutine function as the handler for ``name``."""
+        def register(fn: Handler) -> Handler:
+            self.handlers[name] = fn
+            return fn
+        return register
+
+    async def enqueue(self, name: str, **payload) -> str:
+        """Schedule ``handlers[name](**payload)``; waits only if the queue is full."""
+        if name not in self.handlers:
+            raise KeyError(f"No handler registered for job {name!r}")
+        job = Job(name, payload)
+        if self.outbox is not None:
+            now = datetime.now(timezone.utc)
+            # Leased to this worker, unless it is stopped and the next start should take it
+            lease = timedelta(seconds=JOB_LEASE_SECONDS if self._accepting else 0)
+            await self.outbox.insert_one({
+                "_id": job.id, "name": name, "payload": payload, "status": PENDING,
+                "attempts": 0, "created_at": now, "lease_until": now + lease,
+            })
+        if not self._accepting:
+            # Not started (scripts, tests) or draining: the outbox keeps the job
+            # for the next start; without one it runs here and now
+            if self.outbox is None:
+                await self.handlers[name](**payload)
+            return job.id
+        await self._put(job)
+        return job.id
+
+    async def _put(self, job: Job) -> None:
+        self._unfinished += 1
+        self._idle.clear()
+        await self._queue.put(job)
+
+    def _finished(self) -> None:
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._idle.set()
+
+    async def start(self) -> None:
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        if self.outbox is not None:
+            await self.recover()
+            self._workers.append(asyncio.create_task(self._recover_periodically()))
+
+    async def _recover_periodically(self) -> None:
+        # Picks up jobs whose worker died mid-run once their lease runs out
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 2)
+            try:
+                await self.recover()
+            except Exception:
+                logger.exception("Outbox recovery failed")
+
+    async def recover(self) -> int:
+        """Queue outbox jobs left pending by a stopped or crashed worker.
+
+        Each is claimed by extending its lease, so workers starting together
+        don't both take it.
+        """
+        now = datetime.now(timezone.utc)
+        expired = {"status": PENDING, "lease_until": {"$lte": now}}
+        recovered = 0
+        async for doc in self.outbox.find(expired, {"_id": 1}):
+            claimed = await self.outbox.find_one_and_update(
+                {"_id": doc["_id"], **expired},
+                {"$set": {"lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)}},
+            )
+            if claimed and claimed["name"] in self.handlers:
+                await self._put(Job(claimed["name"], claimed["payload"], id=claimed["_id"],
+                                    attempts=claimed.get("attempts", 0)))
+                recovered += 1
+        if recovered:
+            logger.info("Recovered %d pending background jobs from the outbox", recovered)
+        return recovered
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception("Background job bookkeeping failed for %s (%s)", job.name, job.id)
+                self._finished()
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.attempts += 1
+        start = time.perf_counter()
+        try:
+            await self.handlers[job.name](**job.payload)
+        except Exception as e:
+            JOB_DURATION.observe(time.perf_counter() - start, job=job.name)
+            if job.attempts >= self.max_attempts:
+                JOBS.inc(job=job.name, outcome="failed")
+                logger.exception("Background job %s (%s) failed after %d attempts", job.name, job.id, job.attempts)
+                await self._record(job, DEAD, error=repr(e))
+                self._finished()
+                return
+            JOBS.inc(job=job.name, outcome="retried")
+            delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+            delay *= random.uniform(0.5, 1.0)
+            logger.warning("Background job %s (%s) attempt %d failed (%r); retrying in %.1fs",
+                           job.name, job.id, job.attempts, e, delay)
+            await self._record(job, PENDING, error=repr(e), hold=delay)
+            retry = asyncio.create_task(self._retry_later(job, delay))
+            self._retries.add(retry)
+            retry.add_done_callback(self._retries.discard)
+            return
+        JOB_DURATION.observe(time.perf_counter() - start, job=job.name)
+        JOBS.inc(job=job.name, outcome="succeeded")
+        await self._record(job, DONE)
+        self._finished()
+
+    async def _retry_later(self, job: Job, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self._queue.put(job)
+
+    async def _record(self, job: Job, status: str, error: Optional[str] = None, hold: float = 0) -> None:
+        if self.outbox is None:
+            return
+        now = datetime.now(timezone.utc)
+        update = {"status": status, "attempts": job.attempts, "updated_at": now}
+        if error:
+            update["last_error"] = error
+        if status == PENDING:
+            # Still ours until the retry has had its chance to run
+            update["lease_until"] = now + timedelta(seconds=hold + JOB_LEASE_SECONDS)
+        else:
+            update["finished_at"] = now
+        await self.outbox.update_one({"_id": job.id}, {"$set": update})
+
+    async def drain(self, timeout: float = JOB_DRAIN_TIMEOUT_SECONDS) -> bool:
+        """Stop intake and let outstanding jobs finish; True if all did."""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            drained = True
+        except asyncio.TimeoutError:
+            drained = False
+            logger.warning("Stopping with %d background jobs unfinished%s", self._unfinished,
+                           " (kept in the outbox)" if self.outbox is not None else "")
+        for task in [*self._workers, *self._retries]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._workers = []
+        return drained
@@ -0,0 +1,77 @@
+"""Lean read path: schema-shaped MongoDB projections and orjson responses.
+
+``lean_projection(Model)`` derives a projection that makes MongoDB return
+documents already in the exact JSON shape FastAPI would produce for
+``response_model=Model``: extra fields dropped, missing optionals as
+``null``, defaults filled in and float fields coerced to doubles. Rows
+projected this way can be rendered by ``FastJSONResponse`` directly,
+skipping the per-row Pydantic validation of the regular path.
+"""
+from enum import Enum
+from typing import Any, Dict, List, Union, get_args, get_origin
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+_NO_DEFAULT = object()
+
+
+def dumps(content: Any) -> bytes:
+    # OPT_UTC_Z matches Pydantic's "...Z" rendering of UTC datetimes
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def ndjson_line(doc: Any) -> bytes:
+    return dumps(doc) + b"\n"
+
+
+def _fallback(field) -> Any:
+    if field.default is PydanticUndefined:
+        return _NO_DEFAULT
+    if isinstance(field.default, Enum):
+        return field.default.value
+    return field.default
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _expression(annotation, path: str, fallback: Any) -> Any:
+    if get_origin(annotation) is Union and type(None) in get_args(annotation):
+        annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+        fallback = None
+
+    if _is_model(annotation):
+        return _model_expressions(annotation, path + ".")
+    if get_origin(annotation) in (list, List) and get_args(annotation) and _is_model(get_args(annotation)[0]):
+        return {"$map": {
+            "input": {"$ifNull": [path, []]},
+            "as": "item",
+            "in": _model_expressions(get_args(annotation)[0], "$$item."),
+        }}
+    if annotation is float:
+        on_null = None if fallback in (_NO_DEFAULT, None) else float(fallback)
+        return {"$convert": {"input": path, "to": "double", "onNull": on_null}}
+    if fallback is not _NO_DEFAULT:
+        return {"$ifNull": [path, {"$literal": fallback}]}
+    return path
+
+
+def _model_expressions(model, prefix: str) -> Dict[str, Any]:
+    return {
+        name: _expression(field.annotation, prefix + name, _fallback(field))
+        for name, field in model.model_fields.items()
+    }
+
+
+def lean_projection(model) -> Dict[str, Any]:
+    """Projection returning documents shaped exactly like ``model``'s JSON output."""
+    return {"_id": 0, **_model_expressions(model, "$")}
@@ -0,0 +1,266 @@
+"""Request latency, MongoDB time per request and N+1 detection.
+
+``MetricsMiddleware`` times every HTTP request and labels it with the
+matched route template. ``MongoCommandListener`` (a pymongo command
+listener) attributes each command to the request that issued it through a
+context variable, so per-request command counts and DB time are known
+when the request finishes. Two N+1 shapes are flagged:
+
+* within one request, the same command shape (collection, command, filter
+  keys) repeated ``N_PLUS_ONE_THRESHOLD`` times, e.g. a fetch per cart line;
+* across requests, one client hitting the same route ``FAN_OUT_THRESHOLD``
+  times within ``FAN_OUT_WINDOW_SECONDS``, e.g. a page fetching products
+  one by one.
+
+Everything is rendered in the Prometheus text format by ``REGISTRY.render()``
+and requests slower than ``SLOW_REQUEST_MS`` are logged with their DB stats.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "5"))
+FAN_OUT_THRESHOLD = int(os.environ.get("FAN_OUT_THRESHOLD", "10"))
+FAN_OUT_WINDOW_SECONDS = float(os.environ.get("FAN_OUT_WINDOW_SECONDS", "2"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.values: Dict[Labels, float] = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        with self.lock:
+            self.values[_labels(**labels)] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            snapshot = sorted(self.values.items())
+        for labels, value in snapshot:
+            yield f"{self.name}{_format_labels(labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name, self.help, self.buckets = name, help, tuple(buckets)
+        self.counts: Dict[Labels, list] = {}
+        self.sums: Dict[Labels, float] = defaultdict(float)
+        # Observed from Motor's executor threads as well as the event loop
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(**labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self.sums[key] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            snapshot = sorted((labels, list(counts)) for labels, counts in self.counts.items())
+        for labels, counts in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {self.sums[labels]}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class Gauge:
+    """Read at scrape time from ``collect()``, which returns ``{labels: value}``."""
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Dict[Labels, float]]):
+        self.name, self.help, self.collect = name, help, collect
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in sorted(self.collect().items()):
+            yield f"{self.name}{_format_labels(labels)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", LATENCY_BUCKETS))
+REQUEST_DB_COMMANDS = REGISTRY.register(Histogram(
+    "http_request_mongo_commands", "MongoDB commands issued per HTTP request.", COMMAND_COUNT_BUCKETS))
+REQUEST_DB_TIME = REGISTRY.register(Histogram(
+    "http_request_mongo_seconds", "Time spent in MongoDB commands per HTTP request.", LATENCY_BUCKETS))
+MONGO_COMMAND_LATENCY = REGISTRY.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency.", LATENCY_BUCKETS))
+MONGO_COMMAND_FAILURES = REGISTRY.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands."))
+SLOW_REQUESTS = REGISTRY.register(Counter(
+    "http_slow_requests_total", f"Requests slower than SLOW_REQUEST_MS ({SLOW_REQUEST_MS:g} ms)."))
+N_PLUS_ONE = REGISTRY.register(Counter(
+    "mongo_n_plus_one_total", "Requests repeating one MongoDB command shape N_PLUS_ONE_THRESHOLD+ times."))
+FAN_OUT = REGISTRY.register(Counter(
+    "http_fan_out_total", "Bursts of FAN_OUT_THRESHOLD+ requests from one client to one route."))
+
+
+class RequestStats:
+    __slots__ = ("commands", "db_seconds", "shapes", "lock")
+
+    def __init__(self):
+        self.commands = 0
+        self.db_seconds = 0.0
+        self.shapes: Dict[Tuple[str, str, Tuple[str, ...]], int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def command_shape(event: monitoring.CommandStartedEvent) -> Tuple[str, str, Tuple[str, ...]]:
+    collection = event.command.get(event.command_name)
+    query = event.command.get("filter") or event.command.get("query") or {}
+    if event.command_name in ("update", "delete") and event.command.get(event.command_name + "s"):
+        query = event.command[event.command_name + "s"][0].get("q", {})
+    return str(collection), event.command_name, tuple(sorted(query)) if isinstance(query, dict) else ()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Attributes commands to the current request. pymongo calls these on
+    Motor's executor threads, which run in a copy of the calling task's
+    context, so the request's context variables are visible there."""
+
+    def __init__(self):
+        self._pending: Dict[int, Tuple[RequestStats, Tuple[str, str, Tuple[str, ...]]]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        stats = _current.get()
+        if stats is None:
+            return
+        with self._lock:
+            self._pending[event.request_id] = (stats, command_shape(event))
+
+    def _finish(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_LATENCY.observe(seconds, command=event.command_name)
+        if failed:
+            MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+        with self._lock:
+            pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        stats, shape = pending
+        with stats.lock:
+            stats.commands += 1
+            stats.db_seconds += seconds
+            stats.shapes[shape] += 1
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+class MetricsMiddleware:
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.fan_out = TTLCache(maxsize=10_000, ttl=FAN_OUT_WINDOW_SECONDS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            self._record(scope, status["code"], elapsed, stats)
+
+    def _record(self, scope, status: int, elapsed: float, stats: RequestStats) -> None:
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        method = scope["method"]
+        REQUEST_LATENCY.observe(elapsed, method=method, route=route, status=str(status))
+        REQUEST_DB_COMMANDS.observe(stats.commands, method=method, route=route)
+        REQUEST_DB_TIME.observe(stats.db_seconds, method=method, route=route)
+
+        repeated = {shape: n for shape, n in stats.shapes.items() if n >= N_PLUS_ONE_THRESHOLD}
+        for (collection, command, keys), n in repeated.items():
+            N_PLUS_ONE.inc(route=route, collection=collection, command=command)
+            logger.warning("N+1 suspected on %s %s: %d x %s %s by %s",
+                           method, route, n, command, collection, ",".join(keys) or "-")
+
+        if route != "unmatched":
+            client = (scope.get("client") or ("-",))[0]
+            key = (client, method, route)
+            now = time.monotonic()
+            hits = [t for t in self.fan_out.get(key, []) if t > now - FAN_OUT_WINDOW_SECONDS] + [now]
+            self.fan_out.set(key, hits)
+            if len(hits) == FAN_OUT_THRESHOLD:
+                FAN_OUT.inc(method=method, route=route)
+                logger.warning("Request fan-out from %s: %d x %s %s within %gs",
+                               client, len(hits), method, route, FAN_OUT_WINDOW_SECONDS)
+
+        if elapsed * 1000 >= self.slow_request_ms:
+            SLOW_REQUESTS.inc(method=method, route=route)
+            logger.warning("Slow request %s %s -> %d in %.0f ms (%d Mongo commands, %.0f ms in Mongo)",
+                           method, scope["path"], status, elapsed * 1000, stats.commands, stats.db_seconds * 1000)
+
@@ -0,0 +1,85 @@
+"""One-shot migration of ISO-string timestamps to native BSON dates.
+
+Older code stored ``created_at``/``updated_at`` as ISO strings on users,
+orders, reviews and carts (and the legacy product seed did too). Run once
+after deploying; it only touches documents that still hold strings, so it
+is safe to re-run:
+
+    python migrate_timestamps.py            # migrate
+    python migrate_timestamps.py --dry-run  # count what would change
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+TIMESTAMP_FIELDS = {
+    "users": ["created_at"],
+    "products": ["created_at", "updated_at"],
+    "orders": ["created_at", "updated_at"],
+    "reviews": ["created_at"],
+    "carts": ["updated_at"],
+}
+
+BATCH_SIZE = 1000
+
+
+def parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+async def migrate_collection(collection, fields, dry_run: bool = False) -> dict:
+    stats = {"scanned": 0, "updated": 0, "unparseable": 0}
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+    batch = []
+    async for doc in collection.find(query, projection).batch_size(BATCH_SIZE):
+        stats["scanned"] += 1
+        changes = {}
+        for field in fields:
+            if isinstance(doc.get(field), str):
+                try:
+                    changes[field] = parse_timestamp(doc[field])
+                except ValueError:
+                    stats["unparseable"] += 1
+        if not changes:
+            continue
+        stats["updated"] += 1
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+        if len(batch) >= BATCH_SIZE:
+            if not dry_run:
+                await collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch and not dry_run:
+        await collection.bulk_write(batch, ordered=False)
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Convert ISO-string timestamps to BSON dates.")
+    parser.add_argument("--dry-run", action="store_true", help="count affected documents without writing")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        for name, fields in TIMESTAMP_FIELDS.items():
+            stats = await migrate_collection(db[name], fields, dry_run=args.dry_run)
+            verb = "would update" if args.dry_run else "updated"
+            print(f"{name}: {verb} {stats['updated']} of {stats['scanned']} documents"
+                  + (f", {stats['unparseable']} unparseable values left as-is" if stats["unparseable"] else ""))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Catalog models shared by the API and the offline catalog tools.
+
+Kept apart from server.py so scripts such as import_catalog.py can validate
+rows without importing the app (and with it the database client).
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from ratings import EMPTY_HISTOGRAM
+
+
+class Category(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    slug: str
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+
+class CategoryCreate(BaseModel):
+    name: str
+    slug: str
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+
+class Product(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    slug: str
+    description: str
+    price: float
+    discount_price: Optional[float] = None
+    category_id: str
+    images: List[str] = []
+    sizes: List[str] = []
+    colors: List[str] = []
+    care_instructions: Optional[str] = None
+    in_stock: bool = True
+    stock_quantity: int = 0
+    featured: bool = False
+    rating_count: int = 0
+    rating_sum: int = 0
+    rating_avg: float = 0
+    rating_histogram: Dict[str, int] = EMPTY_HISTOGRAM
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ProductCreate(BaseModel):
+    name: str
+    slug: str
+    description: str
+    price: float
+    discount_price: Optional[float] = None
+    category_id: str
+    images: List[str] = []
+    sizes: List[str] = []
+    colors: List[str] = []
+    care_instructions: Optional[str] = None
+    stock_quantity: int = 0
+    featured: bool = False
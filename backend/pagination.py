@@ -0,0 +1,134 @@
+"""Keyset (cursor) pagination helpers shared by the list endpoints.
+
+A cursor is an opaque, URL-safe token holding the sort-key values of the
+last row on the previous page. The next page is selected with a range
+filter on those keys instead of ``skip``, so every page costs the same
+index walk no matter how deep the client has paged.
+
+Cursors come back from the client, so ``decode_cursor`` only accepts one
+scalar per sort key, of the type the response model declares for that
+field; anything else (an operator object such as ``{"$ne": null}``, a list,
+a string where a date belongs) is a 400 rather than part of a query.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, get_args, get_origin
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+SortSpec = Sequence[Tuple[str, int]]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if value.keys() != {"$date"} or not isinstance(value["$date"], str):
+            raise ValueError("not a cursor value")
+        return datetime.fromisoformat(value["$date"])
+    if isinstance(value, list):
+        raise ValueError("not a cursor value")
+    return value
+
+
+def _allowed_types(annotation) -> Tuple[type, ...]:
+    if get_origin(annotation) is Union:
+        return sum((_allowed_types(arg) for arg in get_args(annotation)), ())
+    if annotation is type(None):
+        return (type(None),)
+    if annotation is float:
+        return (int, float)
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return (str,)
+    if annotation in (str, int, bool, datetime):
+        return (annotation,)
+    raise TypeError(f"{annotation!r} is not a sortable field type")
+
+
+def _matches(value: Any, types: Tuple[type, ...]) -> bool:
+    # bool is an int subclass, but True is no price
+    if isinstance(value, bool) and bool not in types:
+        return False
+    return isinstance(value, types)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: SortSpec, model) -> List[Any]:
+    """Decode a cursor for ``sort`` over rows of ``model``; raises a 400 if it doesn't fit.
+
+    Sort keys that are not fields of ``model`` (the text search score) must
+    be numbers.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        values = [_decode_value(v) for v in values]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    for (field, _), value in zip(sort, values):
+        info = model.model_fields.get(field)
+        if not _matches(value, _allowed_types(info.annotation) if info else (int, float)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset_filter(sort: SortSpec, values: Sequence[Any]) -> Dict[str, Any]:
+    """Build the filter selecting rows strictly after ``values`` in ``sort`` order."""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {f: values[j] for j, (f, _) in enumerate(sort[:i])}
+        branch[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+def paginate(rows: List[Dict[str, Any]], sort: SortSpec, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim a ``limit + 1`` fetch to one page and derive the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor([last.get(field) for field, _ in sort])
+
+
+def _sort_key(value: Any) -> Tuple[bool, Any]:
+    # MongoDB sorts null and missing values before everything else
+    return value is not None, value
+
+
+def sort_rows(rows: List[Dict[str, Any]], sort: SortSpec) -> List[Dict[str, Any]]:
+    """Order in-memory rows like a MongoDB ``$sort`` on ``sort``."""
+    for field, direction in reversed(sort):
+        rows.sort(key=lambda row: _sort_key(row.get(field)), reverse=direction < 0)
+    return rows
+
+
+def _is_after(row: Dict[str, Any], sort: SortSpec, values: Sequence[Any]) -> bool:
+    for (field, direction), value in zip(sort, values):
+        current, value = _sort_key(row.get(field)), _sort_key(value)
+        if current != value:
+            return current > value if direction > 0 else current < value
+    return False
+
+
+def rows_after(rows: List[Dict[str, Any]], sort: SortSpec, values: Sequence[Any]) -> List[Dict[str, Any]]:
+    """In-memory counterpart of ``keyset_filter`` for rows already sorted by ``sort``."""
+    return [row for row in rows if _is_after(row, sort, values)]
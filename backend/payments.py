@@ -0,0 +1,224 @@
+"""Payment gateway adapters used by the order routes.
+
+``RazorpayGateway`` talks to the Razorpay REST API over a pooled async HTTP
+client with strict timeouts, jittered retries and a circuit breaker, so a
+slow or unreachable gateway degrades checkout instead of freezing the
+worker. Creating an order is not idempotent, so it is only retried when
+the request cannot have reached Razorpay (connection failures, 429).
+``FakePaymentGateway`` has the same interface and needs no network, for
+local runs and load tests (``PAYMENT_GATEWAY=fake``).
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import time
+import uuid
+from typing import Optional
+
+import httpx
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+class CircuitOpenError(PaymentGatewayError):
+    pass
+
+
+class OrderRejectedError(PaymentGatewayError):
+    """Razorpay answered and refused the request (a 4xx other than 429)."""
+
+
+# Failures before the request was sent, so a retry cannot duplicate the order
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitBreaker:
+    """Fail fast after ``failure_threshold`` consecutive failures.
+
+    After ``reset_timeout`` seconds one trial call is let through; its
+    outcome closes the circuit again or re-opens it for another period.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def abandon(self) -> None:
+        """The call ended without an outcome (cancelled); let another be the trial."""
+        self._trial_in_flight = False
+
+
+def _signature(secret: str, order_id: str, payment_id: str) -> str:
+    message = f"{order_id}|{payment_id}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class RazorpayGateway:
+    base_url = "https://api.razorpay.com/v1"
+
+    def __init__(
+        self,
+        key_id: str,
+        key_secret: str,
+        timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff: float = 0.2,
+        max_connections: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            auth=(key_id, key_secret),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 2.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def create_order(self, amount: int, currency: str = "INR", receipt: Optional[str] = None) -> dict:
+        if not (self.key_id and self.key_secret):
+            raise PaymentGatewayError("Razorpay is not configured")
+        if not self.breaker.allow():
+            raise CircuitOpenError("Razorpay circuit is open")
+
+        payload = {"amount": amount, "currency": currency, "payment_capture": 1}
+        if receipt:
+            payload["receipt"] = receipt[:40]
+
+        # Every way out records an outcome, or a half-open trial would never end
+        try:
+            order = await self._post_order(payload)
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except OrderRejectedError:
+            # The gateway is healthy; the request itself was rejected
+            self.breaker.record_success()
+            raise
+        except PaymentGatewayError:
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            raise PaymentGatewayError(f"Razorpay unavailable: {e!r}") from e
+        self.breaker.record_success()
+        return order
+
+    async def _post_order(self, payload: dict) -> dict:
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Full jitter keeps retries from many workers from synchronising
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            try:
+                response = await self._client.post("/orders", json=payload)
+            except _NOT_SENT as e:
+                last_error = e
+                continue
+            if response.status_code == 429:
+                last_error = PaymentGatewayError("Razorpay returned 429")
+                continue
+            if response.status_code >= 500:
+                # It may have created the order anyway, so no retry
+                raise PaymentGatewayError(f"Razorpay returned {response.status_code}")
+            if response.status_code >= 400:
+                raise OrderRejectedError(f"Razorpay rejected the order: {response.text[:200]}")
+            return response.json()
+        raise PaymentGatewayError(f"Razorpay unavailable: {last_error}")
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        if not self.key_secret:
+            return False
+        return hmac.compare_digest(_signature(self.key_secret, order_id, payment_id), signature)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class FakePaymentGateway:
+    """In-process stand-in that mimics Razorpay's order and signature behaviour."""
+
+    def __init__(self, key_secret: str = "fake_secret", latency: float = 0.0, failure_rate: float = 0.0):
+        self.key_secret = key_secret
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    async def create_order(self, amount: int, currency: str = "INR", receipt: Optional[str] = None) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise PaymentGatewayError("Fake gateway failure")
+        return {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "amount": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "status": "created",
+        }
+
+    def sign(self, order_id: str, payment_id: str) -> str:
+        """Signature the checkout widget would hand back for a successful payment."""
+        return _signature(self.key_secret, order_id, payment_id)
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        return hmac.compare_digest(self.sign(order_id, payment_id), signature)
+
+    async def aclose(self) -> None:
+        pass
+
+
+def gateway_from_env():
+    if os.environ.get("PAYMENT_GATEWAY", "razorpay") == "fake":
+        return FakePaymentGateway(
+            latency=float(os.environ.get("FAKE_GATEWAY_LATENCY_MS", "0")) / 1000,
+            failure_rate=float(os.environ.get("FAKE_GATEWAY_FAILURE_RATE", "0")),
+        )
+    return RazorpayGateway(
+        os.environ.get('RAZORPAY_KEY_ID', ''),
+        os.environ.get('RAZORPAY_KEY_SECRET', ''),
+        timeout=float(os.environ.get("RAZORPAY_TIMEOUT_SECONDS", "5")),
+        max_retries=int(os.environ.get("RAZORPAY_MAX_RETRIES", "2")),
+        max_connections=int(os.environ.get("RAZORPAY_MAX_CONNECTIONS", "20")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get("RAZORPAY_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.environ.get("RAZORPAY_BREAKER_RESET_SECONDS", "30")),
+        ),
+    )
@@ -0,0 +1,97 @@
+"""Server-side order pricing from an in-memory price book.
+
+Orders are priced from the catalog, never from what the client sends.
+``PriceBook`` keeps ``id -> {name, price, discount_price, category_id}``
+for the whole catalog in memory, so a cart is priced in one pass without
+a database round trip per line. It is kept current three ways:
+
+* the product routes call ``update``/``remove`` on every write;
+* products it has never seen (created by another worker or an import) are
+  fetched in one ``$in`` query on first use;
+* the whole book is reloaded after ``PRICE_BOOK_TTL_SECONDS``, which bounds
+  how long a price change made by another worker can take to arrive.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PRICE_BOOK_TTL_SECONDS = float(os.environ.get("PRICE_BOOK_TTL_SECONDS", "60"))
+PRICE_FIELDS = ("id", "name", "price", "discount_price", "category_id")
+PRICE_PROJECTION = {"_id": 0, **{field: 1 for field in PRICE_FIELDS}}
+
+
+def unit_price(product: dict) -> float:
+    """What one unit costs: the discounted price when there is one."""
+    return product.get("discount_price") or product.get("price") or 0
+
+
+def _entry(product: dict) -> dict:
+    return {field: product.get(field) for field in PRICE_FIELDS}
+
+
+class PriceBook:
+    def __init__(self, ttl: float = PRICE_BOOK_TTL_SECONDS):
+        self.ttl = ttl
+        self.entries: Dict[str, dict] = {}
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        # Writes seen while a reload is in flight, replayed over its snapshot
+        self._writes: Optional[Dict[str, Optional[dict]]] = None
+
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    async def refresh(self, products, force: bool = False) -> None:
+        async with self._lock:
+            if not force and not self.stale():
+                return
+            self._writes = {}
+            try:
+                rows = await products.find({}, PRICE_PROJECTION).to_list(None)
+                entries = {row["id"]: _entry(row) for row in rows if row.get("id")}
+                for product_id, entry in self._writes.items():
+                    if entry is None:
+                        entries.pop(product_id, None)
+                    else:
+                        entries[product_id] = entry
+                self.entries = entries
+                self.loaded_at = time.monotonic()
+            finally:
+                self._writes = None
+
+    def update(self, product: dict) -> None:
+        entry = _entry(product)
+        self.entries[entry["id"]] = entry
+        if self._writes is not None:
+            self._writes[entry["id"]] = entry
+
+    def remove(self, product_id: str) -> None:
+        self.entries.pop(product_id, None)
+        if self._writes is not None:
+            self._writes[product_id] = None
+
+    async def lookup(self, products, product_ids: Iterable[str]) -> Dict[str, dict]:
+        """Price entries for ``product_ids``; unknown products are simply absent."""
+        if self.stale():
+            await self.refresh(products)
+        product_ids = list(dict.fromkeys(product_ids))
+        missing = [pid for pid in product_ids if pid not in self.entries]
+        if missing:
+            async for row in products.find({"id": {"$in": missing}}, PRICE_PROJECTION):
+                self.update(row)
+        return {pid: self.entries[pid] for pid in product_ids if pid in self.entries}
+
+
+def price_items(items: Iterable[dict], entries: Dict[str, dict]) -> Tuple[List[dict], float]:
+    """Order lines with catalog names and unit prices, and their subtotal.
+
+    Every ``product_id`` must be in ``entries``.
+    """
+    lines, subtotal = [], 0.0
+    for item in items:
+        entry = entries[item["product_id"]]
+        price = unit_price(entry)
+        lines.append({**item, "product_name": entry["name"], "price": price})
+        subtotal += price * item["quantity"]
+    return lines, round(subtotal, 2)
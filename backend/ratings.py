@@ -0,0 +1,138 @@
+"""Per-product rating aggregates, denormalized onto the product document.
+
+Each product carries ``rating_count``, ``rating_sum``, ``rating_avg`` and a
+``rating_histogram`` of review counts per star ("1".."5"), so listings can
+sort and filter by rating and product pages can draw the star breakdown
+without reading the reviews collection.
+
+``record_rating`` applies one new review with a single ``$inc``. Products
+created before the aggregates existed are brought up to date by a
+recompute from the reviews collection, which is also safe to re-run
+whenever the two might have drifted (a review posted mid-recompute can be
+missed; running it again picks it up). The API runs ``backfill_missing``
+at startup, which does the same for products that have no aggregates at
+all, since rating sort cursors are built from the stored values:
+
+    python ratings.py            # backfill every product
+    python ratings.py --dry-run  # count what would change
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+
+STARS = range(1, 6)
+EMPTY_HISTOGRAM: Dict[str, int] = {str(star): 0 for star in STARS}
+
+BATCH_SIZE = 1000
+# Products stored before the aggregates existed
+MISSING_AGGREGATES = {"$or": [{"rating_avg": None}, {"rating_count": None}]}
+
+
+def initial_aggregates() -> dict:
+    return {"rating_count": 0, "rating_sum": 0, "rating_avg": 0.0, "rating_histogram": dict(EMPTY_HISTOGRAM)}
+
+
+def aggregates(count: int, total: int, histogram: Dict[str, int]) -> dict:
+    return {
+        "rating_count": count,
+        "rating_sum": total,
+        "rating_avg": total / count if count else 0.0,
+        "rating_histogram": {**EMPTY_HISTOGRAM, **histogram},
+    }
+
+
+async def record_rating(products, product_id: str, rating: int) -> Optional[dict]:
+    """Count one ``rating`` on the product; returns None if it does not exist."""
+    after = await products.find_one_and_update(
+        {"id": product_id},
+        {"$inc": {"rating_count": 1, "rating_sum": rating, f"rating_histogram.{rating}": 1}},
+        projection={"_id": 0, "rating_count": 1, "rating_sum": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if after is None:
+        return None
+    # The average can't be incremented. Only the write that still sees its own
+    # count may set it, so racing reviews never leave a stale average behind.
+    await products.update_one(
+        {"id": product_id, "rating_count": after["rating_count"]},
+        {"$set": {"rating_avg": after["rating_sum"] / after["rating_count"]}},
+    )
+    return after
+
+
+def review_totals_pipeline() -> list:
+    return [{"$group": {
+        "_id": "$product_id",
+        "count": {"$sum": 1},
+        "sum": {"$sum": "$rating"},
+        **{f"s{star}": {"$sum": {"$cond": [{"$eq": ["$rating", star]}, 1, 0]}} for star in STARS},
+    }}]
+
+
+def _totals(row: dict) -> dict:
+    return aggregates(row["count"], row["sum"], {str(star): row[f"s{star}"] for star in STARS})
+
+
+async def backfill(db, dry_run: bool = False) -> dict:
+    """Recompute every product's aggregates from its reviews."""
+    totals = {row["_id"]: _totals(row) async for row in db.reviews.aggregate(review_totals_pipeline())}
+    stats = {"products": 0, "rated": 0, "updated": 0}
+    batch = []
+    fields = {"_id": 0, "id": 1, **{field: 1 for field in initial_aggregates()}}
+    async for product in db.products.find({}, fields).batch_size(BATCH_SIZE):
+        stats["products"] += 1
+        expected = totals.get(product["id"]) or initial_aggregates()
+        stats["rated"] += expected["rating_count"] > 0
+        if all(product.get(field) == value for field, value in expected.items()):
+            continue
+        stats["updated"] += 1
+        batch.append(UpdateOne({"id": product["id"]}, {"$set": expected}))
+        if len(batch) >= BATCH_SIZE:
+            if not dry_run:
+                await db.products.bulk_write(batch, ordered=False)
+            batch = []
+    if batch and not dry_run:
+        await db.products.bulk_write(batch, ordered=False)
+    return stats
+
+
+async def backfill_missing(db) -> int:
+    """Compute the aggregates of products that have none; returns how many."""
+    ids = [product["id"] async for product in db.products.find(MISSING_AGGREGATES, {"_id": 0, "id": 1})]
+    if not ids:
+        return 0
+    pipeline = [{"$match": {"product_id": {"$in": ids}}}, *review_totals_pipeline()]
+    totals = {row["_id"]: _totals(row) async for row in db.reviews.aggregate(pipeline)}
+    for start in range(0, len(ids), BATCH_SIZE):
+        await db.products.bulk_write([
+            # Still missing, so a product rated meanwhile keeps its live counts
+            UpdateOne({"id": product_id, **MISSING_AGGREGATES},
+                      {"$set": totals.get(product_id) or initial_aggregates()})
+            for product_id in ids[start:start + BATCH_SIZE]
+        ], ordered=False)
+    return len(ids)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recompute product rating aggregates from reviews.")
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        stats = await backfill(client[os.environ['DB_NAME']], dry_run=args.dry_run)
+    finally:
+        client.close()
+    action = "would update" if args.dry_run else "updated"
+    print(f"{stats['products']} products ({stats['rated']} rated): {action} {stats['updated']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
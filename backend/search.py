@@ -0,0 +1,198 @@
+"""Product search: relevance ranking, prefix autocomplete and facet counts.
+
+Two interchangeable backends serve the same contracts:
+
+* ``mongo`` (default) – the ``search_text`` index from ``indexes.py`` for
+  ``$text`` queries, and one ``$facet`` aggregation for the filter counts;
+* ``local`` – ``ProductSearchIndex``, an in-process inverted index built from
+  the catalog. It needs no text index, so it suits tests and small
+  deployments, and is rebuilt whenever the catalog cache version changes.
+
+Both rank with the same field weights so results agree across backends.
+"""
+import bisect
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+# Also the weights of the "search_text" index built from INDEX_SPEC.
+FIELD_WEIGHTS = {"name": 10, "colors": 5, "category_id": 3, "description": 2}
+
+# Lower bounds of the price facet buckets; the last bucket is open-ended.
+PRICE_BUCKETS = [0, 500, 1000, 1500, 2000, 3000]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+BATCH_SIZE = 1000
+
+
+def tokenize(text: Any) -> List[str]:
+    if isinstance(text, (list, tuple)):
+        return [token for part in text for token in tokenize(part)]
+    return _TOKEN.findall(str(text or "").lower())
+
+
+def name_key(name: Any) -> str:
+    """The normalized name stored as ``name_key``, which autocomplete range-scans."""
+    return " ".join(tokenize(name))
+
+
+async def backfill_name_keys(db) -> int:
+    """Store ``name_key`` on products written before it existed; returns how many."""
+    rows = await db.products.find({"name_key": None}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    for start in range(0, len(rows), BATCH_SIZE):
+        await db.products.bulk_write([
+            # Only if the name is unchanged; edits store their own key
+            UpdateOne({"id": row["id"], "name": row.get("name")}, {"$set": {"name_key": name_key(row.get("name"))}})
+            for row in rows[start:start + BATCH_SIZE]
+        ], ordered=False)
+    return len(rows)
+
+
+def effective_price(product: dict) -> Optional[float]:
+    """The price facets bucket by: like ``$ifNull``, only a missing discount falls back."""
+    discount_price = product.get("discount_price")
+    return discount_price if discount_price is not None else product.get("price")
+
+
+def _counts(values: Iterable[Any]) -> List[Dict[str, Any]]:
+    counts: Dict[Any, int] = defaultdict(int)
+    for value in values:
+        counts[value] += 1
+    return [{"value": v, "count": n} for v, n in sorted(counts.items(), key=lambda kv: (-kv[1], str(kv[0])))]
+
+
+def _bucket_bounds(lower) -> Dict[str, Any]:
+    i = PRICE_BUCKETS.index(lower)
+    return {"min": lower, "max": PRICE_BUCKETS[i + 1] if i + 1 < len(PRICE_BUCKETS) else None}
+
+
+def facet_pipeline(query: dict) -> List[dict]:
+    """All facet counts for the products matching ``query`` in one round trip."""
+    by_count = {"$sort": {"count": -1, "_id": 1}}
+    return [
+        {"$match": query},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "sizes": [{"$unwind": "$sizes"}, {"$group": {"_id": "$sizes", "count": {"$sum": 1}}}, by_count],
+            "colors": [{"$unwind": "$colors"}, {"$group": {"_id": "$colors", "count": {"$sum": 1}}}, by_count],
+            "categories": [{"$group": {"_id": "$category_id", "count": {"$sum": 1}}}, by_count],
+            "price": [{"$bucket": {
+                "groupBy": {"$ifNull": ["$discount_price", "$price"]},
+                # The extra boundary closes the open-ended top bucket
+                "boundaries": PRICE_BUCKETS + [float("inf")],
+                "default": "unpriced",
+                "output": {"count": {"$sum": 1}},
+            }}],
+        }},
+    ]
+
+
+def format_facets(result: dict) -> dict:
+    return {
+        "total": result["total"][0]["n"] if result["total"] else 0,
+        "sizes": [{"value": f["_id"], "count": f["count"]} for f in result["sizes"]],
+        "colors": [{"value": f["_id"], "count": f["count"]} for f in result["colors"]],
+        "categories": [{"value": f["_id"], "count": f["count"]} for f in result["categories"]],
+        "price": [{**_bucket_bounds(f["_id"]), "count": f["count"]}
+                  for f in result["price"] if f["_id"] != "unpriced"],
+    }
+
+
+class ProductSearchIndex:
+    """Inverted index over the catalog with the same weighting as ``$text``."""
+
+    def __init__(self, products: List[dict], version: int = 0):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.products = {p["id"]: p for p in products}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for product in products:
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(product.get(field)):
+                    self.postings[token][product["id"]] += weight
+        self.vocabulary = sorted(self.postings)
+        self.name_postings: Dict[str, set] = defaultdict(set)
+        for product in products:
+            for token in tokenize(product.get("name")):
+                self.name_postings[token].add(product["id"])
+        self.name_vocabulary = sorted(self.name_postings)
+
+    def age(self) -> float:
+        return time.monotonic() - self.built_at
+
+    @staticmethod
+    def _prefixed(vocabulary: List[str], prefix: str) -> List[str]:
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + "\uffff")
+        return vocabulary[start:end]
+
+    @staticmethod
+    def _accepts(product: dict, category_id: Optional[str], featured: Optional[bool],
+                 min_rating: Optional[float]) -> bool:
+        return ((not category_id or product.get("category_id") == category_id)
+                and (featured is None or product.get("featured") == featured)
+                and (min_rating is None or (product.get("rating_avg") or 0) >= min_rating))
+
+    def search(self, query: str, category_id: Optional[str] = None,
+               featured: Optional[bool] = None, min_rating: Optional[float] = None) -> List[dict]:
+        """Matching products, best first, each with its relevance in ``_score``.
+
+        Any query term may match (as with ``$text``); the last term also
+        matches as a prefix so results keep up while the user is typing.
+        """
+        terms = tokenize(query)
+        scores: Dict[str, float] = defaultdict(float)
+        for i, term in enumerate(terms):
+            matches = self._prefixed(self.vocabulary, term) if i == len(terms) - 1 else [term]
+            for token in matches:
+                for product_id, weight in self.postings.get(token, {}).items():
+                    scores[product_id] += weight if token == term else weight / 2
+        rows = []
+        for product_id, score in scores.items():
+            product = self.products[product_id]
+            if self._accepts(product, category_id, featured, min_rating):
+                rows.append({**product, "_score": score})
+        rows.sort(key=lambda row: (-row["_score"], row["id"]))
+        return rows
+
+    def autocomplete(self, prefix: str, limit: int = 8) -> List[dict]:
+        """Products whose name has a word starting with each typed term."""
+        terms = tokenize(prefix)
+        if not terms:
+            return []
+        matches = None
+        for i, term in enumerate(terms):
+            tokens = self._prefixed(self.name_vocabulary, term) if i == len(terms) - 1 else [term]
+            ids = {pid for token in tokens for pid in self.name_postings.get(token, ())}
+            matches = ids if matches is None else matches & ids
+        phrase = " ".join(terms)
+        ranked = sorted(
+            (self.products[pid] for pid in matches),
+            key=lambda p: (not " ".join(tokenize(p["name"])).startswith(phrase), p["name"].lower(), p["id"]),
+        )
+        return [{"id": p["id"], "name": p["name"], "slug": p.get("slug")} for p in ranked[:limit]]
+
+    def facets(self, products: List[dict]) -> dict:
+        buckets: Dict[int, int] = defaultdict(int)
+        for product in products:
+            price = effective_price(product)
+            if price is None:
+                continue  # "unpriced" in the Mongo pipeline, which is not reported
+            i = bisect.bisect_right(PRICE_BUCKETS, price) - 1
+            if i >= 0:
+                buckets[PRICE_BUCKETS[i]] += 1
+        return {
+            "total": len(products),
+            "sizes": _counts(size for p in products for size in p.get("sizes") or []),
+            "colors": _counts(color for p in products for color in p.get("colors") or []),
+            "categories": _counts(p.get("category_id") for p in products),
+            "price": [{**_bucket_bounds(lower), "count": buckets[lower]} for lower in PRICE_BUCKETS if buckets[lower]],
+        }
+
+    def filter(self, category_id: Optional[str] = None, featured: Optional[bool] = None,
+               min_rating: Optional[float] = None) -> List[dict]:
+        return [p for p in self.products.values() if self._accepts(p, category_id, featured, min_rating)]
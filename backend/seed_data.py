@@ -7,18 +7,17 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+from import_catalog import import_products, upsert_categories  # noqa: E402
+
 async def seed_database():
     # Connect to MongoDB
     mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
+    client = AsyncIOMotorClient(mongo_url, tz_aware=True)
     db = client[os.environ['DB_NAME']]
     
     print("Seeding database...")
     
-    # Clear existing data
-    await db.categories.delete_many({})
-    await db.products.delete_many({})
-    
+    # Upserted by slug, so re-seeding a live database never empties the catalog
     # Categories
     categories = [
         {
@@ -58,8 +57,8 @@ async def seed_database():
         }
     ]
     
-    await db.categories.insert_many(categories)
-    print(f"✓ Created {len(categories)} categories")
+    await upsert_categories(db, categories)
+    print(f"✓ Upserted {len(categories)} categories")
     
     # Sample Products
     products = [
@@ -230,8 +229,8 @@ async def seed_database():
         }
     ]
     
-    await db.products.insert_many(products)
-    print(f"✓ Created {len(products)} products")
+    stats = await import_products(db, enumerate(products, start=1), progress=False)
+    print(f"✓ Products: {stats.inserted} created, {stats.updated} updated")
     
     print("✓ Database seeding completed successfully!")
     client.close()
@@ -1,41 +1,125 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import re
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
+from contextlib import asynccontextmanager
 import uuid
 from datetime import datetime, timezone, timedelta
-import razorpay
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Body
+from fastapi.responses import StreamingResponse
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, keyset_filter, paginate, rows_after, sort_rows
+from cache import CatalogCache, TTLCache
+from indexes import ensure_indexes, log_index_report
+from payments import PaymentGatewayError, gateway_from_env
+import analytics
+import coupons
+import inventory
+from jobs import JobQueue
+from pricing import PriceBook, price_items, unit_price
+from compression import CompressionMiddleware
+from database import Database
+from metrics import REGISTRY, MetricsMiddleware, MongoCommandListener
+from lean import FastJSONResponse, lean_projection, ndjson_line
+from search import ProductSearchIndex, backfill_name_keys, facet_pipeline, format_facets, name_key
+from ratings import backfill_missing, record_rating
+from models import Category, CategoryCreate, Product, ProductCreate
+from http_cache import (
+    CATEGORIES_CACHE, PRODUCT_CACHE, PRODUCT_LIST_CACHE, REVIEWS_CACHE, SEARCH_CACHE,
+    conditional_response, render_json,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (pool options from the environment, see database.py)
+# The command listener feeds per-request Mongo counts and time to /metrics
+mongo_listener = MongoCommandListener()
+database = Database(os.environ['MONGO_URL'], os.environ['DB_NAME'], event_listeners=[mongo_listener])
+db = database.db
+# Catalog reads may be routed to secondaries (MONGO_CATALOG_READ_PREFERENCE)
+catalog_db = database.catalog_db
+
+# Payment gateway (Razorpay, or an offline fake with PAYMENT_GATEWAY=fake)
+payment_gateway = gateway_from_env()
+
+# Catalog cache (per worker; writes through this worker invalidate it immediately)
+catalog_cache = CatalogCache(
+    maxsize=int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES", "2048")),
+    ttl=float(os.environ.get("CATALOG_CACHE_TTL_SECONDS", "60")),
+)
+
+# Catalog prices used to price orders (per worker; see pricing.py)
+price_book = PriceBook()
+
+# Side effects run after the response (see jobs.py); JOB_OUTBOX=1 makes them durable
+job_queue = JobQueue(outbox=db.job_outbox if os.environ.get("JOB_OUTBOX", "0") == "1" else None)
+
+# Opt-in lean read path: list endpoints return schema-shaped Mongo rows through
+# orjson instead of re-validating every row against response_model
+FAST_READS = os.environ.get("FAST_READS", "0") == "1"
 
-# Razorpay client
-razorpay_client = razorpay.Client(auth=(os.environ.get('RAZORPAY_KEY_ID', ''), os.environ.get('RAZORPAY_KEY_SECRET', '')))
+# Product search backend: "mongo" ($text index) or "local" (in-process index)
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "mongo")
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+# bcrypt releases the GIL, so a small pool keeps hashing off the event loop
+# while capping how many cores a burst of logins can take.
+password_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "4")),
+    thread_name_prefix="password-hash",
+)
 
 # JWT Configuration
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "jasubhai-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+# Put id/name into user tokens so get_current_user can skip the users lookup
+EMBED_AUTH_CLAIMS = os.environ.get("EMBED_AUTH_CLAIMS", "0") == "1"
+
+# Verified principals keyed by token signature, so repeat calls with the same
+# token skip both JWT verification and the users lookup
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL_SECONDS", "60")),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.connect()
+    if os.environ.get("ENSURE_INDEXES", "1") != "0":
+        log_index_report(await ensure_indexes(db))
+    backfilled = await backfill_missing(db)
+    if backfilled:
+        logger.info("Computed rating aggregates for %d products that had none", backfilled)
+    backfilled = await backfill_name_keys(db)
+    if backfilled:
+        logger.info("Stored name keys for %d products that had none", backfilled)
+    await job_queue.start()
+    sweeper = asyncio.create_task(inventory.run_sweeper(
+        db, on_sweep=lambda _: catalog_cache.invalidate(), on_expired=release_order_coupon))
+    yield
+    sweeper.cancel()
+    await job_queue.drain()
+    database.close()
+    password_executor.shutdown(wait=False)
+    await payment_gateway.aclose()
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -54,6 +138,18 @@ class PaymentStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class ExportFormat(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+
+class ProductSort(str, Enum):
+    RELEVANCE = "relevance"
+    NEWEST = "newest"
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+    NAME = "name"
+    RATING = "rating"
+
 # Models
 class PhoneAuthRequest(BaseModel):
     name: str
@@ -75,51 +171,37 @@ class UserCreate(BaseModel):
     phone: str
     password: str
 
-class Category(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    slug: str
-    description: Optional[str] = None
-    image_url: Optional[str] = None
+PRODUCT_BATCH_LIMIT = 100
 
-class CategoryCreate(BaseModel):
-    name: str
-    slug: str
-    description: Optional[str] = None
-    image_url: Optional[str] = None
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = []
+    slugs: List[str] = []
 
-class Product(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    slug: str
-    description: str
-    price: float
-    discount_price: Optional[float] = None
-    category_id: str
-    images: List[str] = []
-    sizes: List[str] = []
-    colors: List[str] = []
-    care_instructions: Optional[str] = None
-    in_stock: bool = True
-    stock_quantity: int = 0
-    featured: bool = False
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+class ProductBatchResponse(BaseModel):
+    products: List[Product]
+    missing_ids: List[str] = []
+    missing_slugs: List[str] = []
 
-class ProductCreate(BaseModel):
+class SearchSuggestion(BaseModel):
+    id: str
     name: str
-    slug: str
-    description: str
-    price: float
-    discount_price: Optional[float] = None
-    category_id: str
-    images: List[str] = []
-    sizes: List[str] = []
-    colors: List[str] = []
-    care_instructions: Optional[str] = None
-    stock_quantity: int = 0
-    featured: bool = False
+    slug: Optional[str] = None
+
+class FacetCount(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+class PriceBucket(BaseModel):
+    min: float
+    max: Optional[float] = None
+    count: int
+
+class ProductFacets(BaseModel):
+    total: int
+    sizes: List[FacetCount] = []
+    colors: List[FacetCount] = []
+    categories: List[FacetCount] = []
+    price: List[PriceBucket] = []
 
 class CartItem(BaseModel):
     product_id: str
@@ -134,6 +216,25 @@ class Cart(BaseModel):
     items: List[CartItem] = []
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class HydratedCartItem(BaseModel):
+    product_id: str
+    quantity: int
+    size: Optional[str] = None
+    color: Optional[str] = None
+    product: Optional[Product] = None
+    unit_price: float = 0
+    line_total: float = 0
+
+class HydratedCart(BaseModel):
+    user_id: str
+    items: List[HydratedCartItem] = []
+    item_count: int = 0
+    subtotal: float = 0
+    unavailable_product_ids: List[str] = []
+
+class CartQuantityUpdate(BaseModel):
+    quantity: int = Field(..., ge=1)
+
 class WishlistItem(BaseModel):
     product_id: str
 
@@ -163,7 +264,7 @@ class ReviewCreate(BaseModel):
 class OrderItem(BaseModel):
     product_id: str
     product_name: str
-    quantity: int
+    quantity: int = Field(..., ge=1)
     size: Optional[str] = None
     color: Optional[str] = None
     price: float
@@ -191,16 +292,45 @@ class Order(BaseModel):
     order_status: OrderStatus = OrderStatus.PENDING
     razorpay_order_id: Optional[str] = None
     razorpay_payment_id: Optional[str] = None
+    coupon_code: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class OrderItemCreate(BaseModel):
+    product_id: str
+    quantity: int = Field(..., ge=1)
+    size: Optional[str] = None
+    color: Optional[str] = None
+    # Accepted for older clients but ignored: names and prices come from the catalog
+    product_name: Optional[str] = None
+    price: Optional[float] = None
+
 class OrderCreate(BaseModel):
     user_id: str
-    items: List[OrderItem]
+    items: List[OrderItemCreate] = Field(..., min_length=1)
     shipping_address: ShippingAddress
-    subtotal: float
+    coupon_code: Optional[str] = None
+    # Ignored; the server computes all three
+    subtotal: Optional[float] = None
+    discount: Optional[float] = None
+    total: Optional[float] = None
+
+class CouponValidationRequest(BaseModel):
+    code: str
+    user_id: Optional[str] = None
+    # Optional cart: enables the minimum-value and category checks and prices the discount
+    items: Optional[List[OrderItemCreate]] = None
+
+class CouponValidation(BaseModel):
+    code: str
+    discount_type: str
+    discount_percent: Optional[float] = None
+    discount_amount: Optional[float] = None
+    max_discount: Optional[float] = None
+    min_order_value: float = 0
+    # Discount on the submitted cart (0 without one)
     discount: float = 0
-    total: float
+    subtotal: Optional[float] = None
 
 class PaymentVerification(BaseModel):
     razorpay_order_id: str
@@ -223,6 +353,14 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -233,19 +371,46 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_token_claims(user: dict) -> dict:
+    claims = {"sub": user["email"], "is_admin": user.get("is_admin", False)}
+    if EMBED_AUTH_CLAIMS:
+        claims.update({"uid": user["id"], "name": user["name"]})
+    return claims
+
+def invalidate_user_principal(email: str):
+    principal_cache.discard_where(lambda principal: principal.get("email") == email)
+
 async def get_current_user(token: str):
+    signature = token.rsplit(".", 1)[-1]
+    user = principal_cache.get(signature)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid authentication")
-        user = await db.users.find_one({"email": email}, {"_id": 0})
+        if EMBED_AUTH_CLAIMS and "uid" in payload and "name" in payload:
+            user = {
+                "id": payload["uid"],
+                "name": payload["name"],
+                "email": email,
+                "is_admin": payload.get("is_admin", False),
+            }
+        else:
+            user = await db.users.find_one({"email": email}, {"_id": 0, "password": 0})
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication")
 
+    # Never serve a cached principal past the token's own expiry
+    ttl = principal_cache.ttl
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - datetime.now(timezone.utc).timestamp())
+    principal_cache.set(signature, user, ttl=ttl)
+    return user
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -262,7 +427,7 @@ async def phone_login(data: PhoneAuthRequest):
         # 2️⃣ Create new user automatically
 
         dummy_email = f"{data.phone}@jasubhai.com"
-        dummy_password = get_password_hash(data.phone)  # using phone as password
+        dummy_password = await get_password_hash_async(data.phone)  # using phone as password
 
         new_user = User(
             name=data.name,
@@ -273,15 +438,15 @@ async def phone_login(data: PhoneAuthRequest):
         )
 
         doc = new_user.model_dump()
-        doc["created_at"] = doc["created_at"].isoformat()
 
         await db.users.insert_one(doc)
+        invalidate_user_principal(doc["email"])
         user = doc
 
     # 3️⃣ Create JWT token (IMPORTANT: use email because your auth uses email)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["email"], "is_admin": user.get("is_admin", False)},
+        data=user_token_claims(user),
         expires_delta=access_token_expires
     )
 
@@ -315,12 +480,12 @@ async def login(login_data: AdminLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(login_data.password, user["password"]):
+    if not await verify_password_async(login_data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["email"], "is_admin": user.get("is_admin", False)},
+        data=user_token_claims(user),
         expires_delta=access_token_expires
     )
     
@@ -347,12 +512,12 @@ async def create_default_admin():
         name="Admin",
         email="admin@jasubhaichappal.com",
         phone="9876543210",
-        password=get_password_hash("admin123"),
+        password=await get_password_hash_async("admin123"),
         is_admin=True
     )
     doc = admin.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     await db.users.insert_one(doc)
+    invalidate_user_principal(doc["email"])
     
     return {
         "message": "Admin created successfully",
@@ -362,9 +527,14 @@ async def create_default_admin():
 
 # Category Routes
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).to_list(1000)
-    return categories
+async def get_categories(request: Request):
+    key = catalog_cache.key("categories")
+    rendered = catalog_cache.get(key)
+    if rendered is None:
+        categories = await catalog_db.categories.find({}, {"_id": 0}).to_list(1000)
+        rendered = render_json(categories, List[Category])
+        catalog_cache.set(key, rendered)
+    return conditional_response(request, rendered, CATEGORIES_CACHE)
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(category: CategoryCreate):
@@ -374,53 +544,241 @@ async def create_category(category: CategoryCreate):
     
     category_obj = Category(**category.model_dump())
     await db.categories.insert_one(category_obj.model_dump())
+    catalog_cache.invalidate()
     return category_obj
 
 # Product Routes
+PRODUCT_SORTS = {
+    ProductSort.NEWEST: [("created_at", -1), ("id", -1)],
+    ProductSort.PRICE_ASC: [("price", 1), ("id", 1)],
+    ProductSort.PRICE_DESC: [("price", -1), ("id", -1)],
+    ProductSort.NAME: [("name", 1), ("id", 1)],
+    # Rating aggregates live on the product (see ratings.py); ties go to the most reviewed
+    ProductSort.RATING: [("rating_avg", -1), ("rating_count", -1), ("id", -1)],
+}
+# Search results: best text match first
+RELEVANCE_SORT = [("_score", -1), ("id", 1)]
+
+# Product-shaped rows straight from MongoDB; the overrides also map the legacy
+# seed schema (`stock`, no slug / category_id) onto the Product contract.
+PRODUCT_PROJECTION = {
+    **lean_projection(Product),
+    "slug": {"$ifNull": ["$slug", {"$replaceAll": {
+        "input": {"$toLower": {"$ifNull": ["$name", ""]}}, "find": " ", "replacement": "-"
+    }}]},
+    "category_id": {"$ifNull": ["$category_id", "default-category"]},
+    "in_stock": {"$ifNull": ["$in_stock", {"$gt": [{"$ifNull": ["$stock", 0]}, 0]}]},
+    "stock_quantity": {"$ifNull": ["$stock_quantity", {"$ifNull": ["$stock", 0]}]},
+}
+
+def build_product_filter(category_id: Optional[str], search: Optional[str], featured: Optional[bool],
+                         min_rating: Optional[float] = None) -> dict:
+    query = {}
+    if category_id:
+        query["category_id"] = category_id
+    if featured is not None:
+        query["featured"] = featured
+    if min_rating is not None:
+        query["rating_avg"] = {"$gte": min_rating}
+    if search:
+        query["$text"] = {"$search": search}
+    return query
+
+def product_sort_spec(sort: Optional[ProductSort], search: Optional[str]):
+    if sort is None or sort == ProductSort.RELEVANCE:
+        return RELEVANCE_SORT if search else PRODUCT_SORTS[ProductSort.NEWEST]
+    return PRODUCT_SORTS[sort]
+
+async def query_products(category_id, search, featured, min_rating, sort_spec, limit, cursor):
+    ranked = sort_spec is RELEVANCE_SORT
+    pipeline = [{"$match": build_product_filter(category_id, search, featured, min_rating)}]
+    if ranked:
+        pipeline.append({"$addFields": {"_score": {"$meta": "textScore"}}})
+    if cursor:
+        pipeline.append({"$match": keyset_filter(sort_spec, decode_cursor(cursor, sort_spec, Product))})
+    pipeline += [
+        {"$sort": dict(sort_spec)},
+        {"$limit": limit + 1},
+        {"$project": {**PRODUCT_PROJECTION, "_score": "$_score"} if ranked else PRODUCT_PROJECTION},
+    ]
+    products = await catalog_db.products.aggregate(pipeline).to_list(limit + 1)
+    return paginate(products, sort_spec, limit)
+
+_search_index: Optional[ProductSearchIndex] = None
+
+async def get_search_index() -> ProductSearchIndex:
+    """The local search index, rebuilt on catalog writes and after the cache TTL."""
+    global _search_index
+    if (_search_index is None or _search_index.version != catalog_cache.version
+            or _search_index.age() > catalog_cache.ttl):
+        products = await catalog_db.products.aggregate([{"$project": PRODUCT_PROJECTION}]).to_list(None)
+        _search_index = ProductSearchIndex(products, version=catalog_cache.version)
+    return _search_index
+
+async def search_products_locally(category_id, search, featured, min_rating, sort_spec, limit, cursor):
+    index = await get_search_index()
+    products = index.search(search, category_id=category_id, featured=featured, min_rating=min_rating)
+    if sort_spec is not RELEVANCE_SORT:
+        products = sort_rows(products, sort_spec)
+    if cursor:
+        products = rows_after(products, sort_spec, decode_cursor(cursor, sort_spec, Product))
+    return paginate(products[:limit + 1], sort_spec, limit)
+
 @api_router.get("/products", response_model=List[Product])
-async def get_products():
-    products = await db.products.find({}, {"_id": 0}).to_list(100)
-
-    formatted_products = []
-
-    for p in products:
-        formatted_products.append({
-            "id": p.get("id"),
-            "name": p.get("name"),
-            "slug": p.get("slug") or p.get("name", "").lower().replace(" ", "-"),
-            "description": p.get("description"),
-            "price": p.get("price"),
-            "discount_price": p.get("discount_price"),
-            "category_id": p.get("category_id") or "default-category",
-            "images": p.get("images", []),
-            "sizes": p.get("sizes", []),
-            "colors": p.get("colors", []),
-            "care_instructions": p.get("care_instructions"),
-            "in_stock": p.get("stock", 0) > 0,
-            "stock_quantity": p.get("stock") or p.get("stock_quantity", 0),
-            "featured": p.get("featured", False),
-            "created_at": (
-                datetime.fromisoformat(p["created_at"])
-                if isinstance(p.get("created_at"), str)
-                else p.get("created_at")
-            ),
-        })
-
-    return formatted_products
+async def get_products(
+    request: Request,
+    category_id: Optional[str] = None,
+    search: Optional[str] = None,
+    featured: Optional[bool] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    sort: Optional[ProductSort] = None,
+    limit: int = Query(48, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    search = (search or "").strip() or None
+    key = catalog_cache.key("products", category_id, search, featured, min_rating, sort, limit, cursor)
+    cached = catalog_cache.get(key)
+    if cached is None:
+        sort_spec = product_sort_spec(sort, search)
+        if search and SEARCH_BACKEND == "local":
+            page, next_cursor = await search_products_locally(
+                category_id, search, featured, min_rating, sort_spec, limit, cursor)
+        else:
+            page, next_cursor = await query_products(
+                category_id, search, featured, min_rating, sort_spec, limit, cursor)
+        # The relevance score only orders the page; it is not part of Product
+        page = [{k: v for k, v in p.items() if k != "_score"} for p in page]
+        cached = (render_json(page, None if FAST_READS else List[Product]), next_cursor)
+        catalog_cache.set(key, cached)
+
+    rendered, next_cursor = cached
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return conditional_response(request, rendered, PRODUCT_LIST_CACHE, headers)
+
+@api_router.get("/products/autocomplete", response_model=List[SearchSuggestion])
+async def autocomplete_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(8, ge=1, le=20),
+):
+    key = catalog_cache.key("autocomplete", q.strip().lower(), limit)
+    rendered = catalog_cache.get(key)
+    if rendered is None:
+        if SEARCH_BACKEND == "local":
+            suggestions = (await get_search_index()).autocomplete(q, limit)
+        else:
+            prefix, suggestions = name_key(q), []
+            fields, by_key = {"_id": 0, "id": 1, "name": 1, "slug": 1}, [("name_key", 1), ("id", 1)]
+            if prefix:
+                # Names starting with the prefix: a range scan of the name_key_id index
+                suggestions = await catalog_db.products.find(
+                    {"name_key": {"$gte": prefix, "$lt": prefix + "\uffff"}}, fields
+                ).sort(by_key).limit(limit).to_list(limit)
+            if prefix and len(suggestions) < limit:
+                # Then names with a later word starting with it, matched on the index keys
+                suggestions += await catalog_db.products.find(
+                    {"name_key": {"$regex": " " + re.escape(prefix)},
+                     "id": {"$nin": [p["id"] for p in suggestions]}}, fields
+                ).sort(by_key).limit(limit - len(suggestions)).to_list(limit - len(suggestions))
+        rendered = render_json(suggestions, List[SearchSuggestion])
+        catalog_cache.set(key, rendered)
+    return conditional_response(request, rendered, SEARCH_CACHE)
+
+@api_router.get("/products/facets", response_model=ProductFacets)
+async def get_product_facets(
+    request: Request,
+    category_id: Optional[str] = None,
+    search: Optional[str] = None,
+    featured: Optional[bool] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+):
+    search = (search or "").strip() or None
+    key = catalog_cache.key("facets", category_id, search, featured, min_rating)
+    rendered = catalog_cache.get(key)
+    if rendered is None:
+        if SEARCH_BACKEND == "local":
+            index = await get_search_index()
+            filters = {"category_id": category_id, "featured": featured, "min_rating": min_rating}
+            products = index.search(search, **filters) if search else index.filter(**filters)
+            facets = index.facets(products)
+        else:
+            query = build_product_filter(category_id, search, featured, min_rating)
+            facets = format_facets((await catalog_db.products.aggregate(facet_pipeline(query)).to_list(1))[0])
+        rendered = render_json(facets, ProductFacets)
+        catalog_cache.set(key, rendered)
+    return conditional_response(request, rendered, SEARCH_CACHE)
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+async def get_product(request: Request, product_id: str):
+    key = catalog_cache.key("product", product_id)
+    product = catalog_cache.get(key)
+    if product is None:
+        product = await catalog_db.products.find_one({"id": product_id}, {"_id": 0})
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        catalog_cache.set(key, product)
+    return conditional_response(request, render_json(product, Product), PRODUCT_CACHE)
 
 @api_router.get("/products/slug/{slug}", response_model=Product)
-async def get_product_by_slug(slug: str):
-    product = await db.products.find_one({"slug": slug}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+async def get_product_by_slug(request: Request, slug: str):
+    key = catalog_cache.key("slug", slug)
+    product = catalog_cache.get(key)
+    if product is None:
+        product = await catalog_db.products.find_one({"slug": slug}, {"_id": 0})
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        catalog_cache.set(key, product)
+    return conditional_response(request, render_json(product, Product), PRODUCT_CACHE)
+
+async def fetch_products(ids: List[str] = (), slugs: List[str] = ()):
+    """Resolve products by id and/or slug: cache first, then one indexed query for the rest.
+
+    Returns `(by_id, by_slug)` dicts holding only the products that exist.
+    """
+    by_id, by_slug = {}, {}
+    id_keys = {pid: catalog_cache.key("product", pid) for pid in dict.fromkeys(ids)}
+    slug_keys = {slug: catalog_cache.key("slug", slug) for slug in dict.fromkeys(slugs)}
+    for found, keys in ((by_id, id_keys), (by_slug, slug_keys)):
+        for value, key in keys.items():
+            product = catalog_cache.get(key)
+            if product is not None:
+                found[value] = product
+
+    clauses = []
+    missing_ids = [pid for pid in id_keys if pid not in by_id]
+    missing_slugs = [slug for slug in slug_keys if slug not in by_slug]
+    if missing_ids:
+        clauses.append({"id": {"$in": missing_ids}})
+    if missing_slugs:
+        clauses.append({"slug": {"$in": missing_slugs}})
+    if clauses:
+        query = clauses[0] if len(clauses) == 1 else {"$or": clauses}
+        async for product in catalog_db.products.find(query, {"_id": 0}):
+            if product["id"] in id_keys:
+                by_id[product["id"]] = product
+                catalog_cache.set(id_keys[product["id"]], product)
+            if product.get("slug") in slug_keys:
+                by_slug[product["slug"]] = product
+                catalog_cache.set(slug_keys[product["slug"]], product)
+    return by_id, by_slug
+
+@api_router.post("/products/batch", response_model=ProductBatchResponse)
+async def get_products_batch(request: ProductBatchRequest):
+    if len(request.ids) + len(request.slugs) > PRODUCT_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCT_BATCH_LIMIT} ids and slugs per request")
+
+    by_id, by_slug = await fetch_products(request.ids, request.slugs)
+    products, seen = [], set()
+    for product in [by_id.get(pid) for pid in request.ids] + [by_slug.get(slug) for slug in request.slugs]:
+        if product is not None and product["id"] not in seen:
+            seen.add(product["id"])
+            products.append(product)
+
+    return {
+        "products": products,
+        "missing_ids": [pid for pid in dict.fromkeys(request.ids) if pid not in by_id],
+        "missing_slugs": [slug for slug in dict.fromkeys(request.slugs) if slug not in by_slug],
+    }
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product: ProductCreate):
@@ -429,7 +787,9 @@ async def create_product(product: ProductCreate):
         raise HTTPException(status_code=400, detail="Product with this slug already exists")
     
     product_obj = Product(**product.model_dump(), in_stock=product.stock_quantity > 0)
-    await db.products.insert_one(product_obj.model_dump())
+    await db.products.insert_one({**product_obj.model_dump(), "name_key": name_key(product.name)})
+    catalog_cache.invalidate()
+    price_book.update(product_obj.model_dump())
     return product_obj
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -440,10 +800,13 @@ async def update_product(product_id: str, product: ProductCreate):
     
     product_dict = product.model_dump()
     product_dict["in_stock"] = product.stock_quantity > 0
+    product_dict["name_key"] = name_key(product.name)
     product_dict["updated_at"] = datetime.now(timezone.utc)
     
     await db.products.update_one({"id": product_id}, {"$set": product_dict})
+    catalog_cache.invalidate()
     updated = await db.products.find_one({"id": product_id}, {"_id": 0})
+    price_book.update(updated)
     return updated
 
 @api_router.delete("/products/{product_id}")
@@ -451,62 +814,114 @@ async def delete_product(product_id: str):
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog_cache.invalidate()
+    price_book.remove(product_id)
     return {"message": "Product deleted successfully"}
 
+@api_router.get("/catalog/cache-stats")
+async def get_catalog_cache_stats():
+    return catalog_cache.stats()
+
 # Cart Routes
+def cart_line_match(product_id: str, size: Optional[str], color: Optional[str]) -> dict:
+    """Aggregation expression that is true when `$$item` is the given cart line."""
+    return {"$and": [
+        {"$eq": ["$$item.product_id", {"$literal": product_id}]},
+        {"$eq": [{"$ifNull": ["$$item.size", None]}, {"$literal": size}]},
+        {"$eq": [{"$ifNull": ["$$item.color", None]}, {"$literal": color}]},
+    ]}
+
+async def upsert_cart(user_id: str, update):
+    # Two first-time writers for the same user can both try to insert; the
+    # unique index on carts.user_id rejects one, and its retry is a plain update.
+    try:
+        return await db.carts.update_one({"user_id": user_id}, update, upsert=True)
+    except DuplicateKeyError:
+        return await db.carts.update_one({"user_id": user_id}, update, upsert=True)
+
 @api_router.get("/cart/{user_id}", response_model=Cart)
 async def get_cart(user_id: str):
-    cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0})
-    if not cart:
-        cart = Cart(user_id=user_id)
-        await db.carts.insert_one(cart.model_dump())
+    new_cart = Cart(user_id=user_id).model_dump(exclude={"user_id"})
+    try:
+        cart = await db.carts.find_one_and_update(
+            {"user_id": user_id},
+            {"$setOnInsert": new_cart},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0})
     return cart
 
+@api_router.get("/cart/{user_id}/hydrated", response_model=HydratedCart)
+async def get_hydrated_cart(user_id: str):
+    cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0, "items": 1})
+    items = cart.get("items", []) if cart else []
+    products, _ = await fetch_products(ids=[item["product_id"] for item in items])
+
+    lines = []
+    subtotal = 0
+    for item in items:
+        product = products.get(item["product_id"])
+        price = unit_price(product) if product else 0
+        line_total = price * item["quantity"]
+        subtotal += line_total
+        lines.append({**item, "product": product, "unit_price": price, "line_total": line_total})
+
+    return {
+        "user_id": user_id,
+        "items": lines,
+        "item_count": sum(item["quantity"] for item in items),
+        "subtotal": subtotal,
+        "unavailable_product_ids": sorted({item["product_id"] for item in items} - products.keys()),
+    }
+
 @api_router.post("/cart/{user_id}/add")
 async def add_to_cart(user_id: str, item: CartItem):
-    cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0})
-    if not cart:
-        cart = Cart(user_id=user_id, items=[item.model_dump()])
-        await db.carts.insert_one(cart.model_dump())
-    else:
-        items = cart.get("items", [])
-        existing_item = None
-        for i, cart_item in enumerate(items):
-            if (cart_item["product_id"] == item.product_id and 
-                cart_item.get("size") == item.size and 
-                cart_item.get("color") == item.color):
-                existing_item = i
-                break
-        
-        if existing_item is not None:
-            items[existing_item]["quantity"] += item.quantity
-        else:
-            items.append(item.model_dump())
-        
-        await db.carts.update_one(
-            {"user_id": user_id},
-            {"$set": {"items": items, "updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
+    # Increment the matching line or append a new one in a single atomic
+    # pipeline update, so concurrent adds never overwrite each other.
+    items = {"$ifNull": ["$items", []]}
+    match = cart_line_match(item.product_id, item.size, item.color)
+    await upsert_cart(user_id, [{"$set": {
+        "id": {"$ifNull": ["$id", str(uuid.uuid4())]},
+        "items": {"$cond": [
+            {"$in": [True, {"$map": {"input": items, "as": "item", "in": match}}]},
+            {"$map": {"input": items, "as": "item", "in": {"$cond": [
+                match,
+                {"$mergeObjects": ["$$item", {"quantity": {"$add": ["$$item.quantity", item.quantity]}}]},
+                "$$item",
+            ]}}},
+            {"$concatArrays": [items, [{"$literal": item.model_dump()}]]},
+        ]},
+        "updated_at": datetime.now(timezone.utc),
+    }}])
     
     return {"message": "Item added to cart"}
 
-@api_router.delete("/cart/{user_id}/item/{product_id}")
-async def remove_from_cart(user_id: str, product_id: str, size: Optional[str] = None, color: Optional[str] = None):
-    cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0})
-    if not cart:
+@api_router.put("/cart/{user_id}/item/{product_id}")
+async def update_cart_item_quantity(user_id: str, product_id: str, update: CartQuantityUpdate, size: Optional[str] = None, color: Optional[str] = None):
+    result = await db.carts.update_one(
+        {"user_id": user_id},
+        {"$set": {"items.$[line].quantity": update.quantity, "updated_at": datetime.now(timezone.utc)}},
+        array_filters=[{"line.product_id": product_id, "line.size": size, "line.color": color}],
+    )
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Cart not found")
     
-    items = cart.get("items", [])
-    items = [item for item in items if not (
-        item["product_id"] == product_id and 
-        item.get("size") == size and 
-        item.get("color") == color
-    )]
-    
-    await db.carts.update_one(
+    return {"message": "Cart item updated"}
+
+@api_router.delete("/cart/{user_id}/item/{product_id}")
+async def remove_from_cart(user_id: str, product_id: str, size: Optional[str] = None, color: Optional[str] = None):
+    result = await db.carts.update_one(
         {"user_id": user_id},
-        {"$set": {"items": items, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {
+            "$pull": {"items": {"product_id": product_id, "size": size, "color": color}},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        },
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Cart not found")
     
     return {"message": "Item removed from cart"}
 
@@ -514,134 +929,304 @@ async def remove_from_cart(user_id: str, product_id: str, size: Optional[str] =
 async def clear_cart(user_id: str):
     await db.carts.update_one(
         {"user_id": user_id},
-        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc)}}
     )
     return {"message": "Cart cleared"}
 
 # Wishlist Routes
+async def upsert_wishlist(user_id: str, update: dict):
+    # Same first-write race as upsert_cart, against the unique wishlists.user_id
+    try:
+        return await db.wishlists.update_one({"user_id": user_id}, update, upsert=True)
+    except DuplicateKeyError:
+        return await db.wishlists.update_one({"user_id": user_id}, update, upsert=True)
+
 @api_router.get("/wishlist/{user_id}", response_model=Wishlist)
 async def get_wishlist(user_id: str):
-    wishlist = await db.wishlists.find_one({"user_id": user_id}, {"_id": 0})
-    if not wishlist:
-        wishlist = Wishlist(user_id=user_id)
-        await db.wishlists.insert_one(wishlist.model_dump())
+    new_wishlist = Wishlist(user_id=user_id).model_dump(exclude={"user_id"})
+    try:
+        wishlist = await db.wishlists.find_one_and_update(
+            {"user_id": user_id},
+            {"$setOnInsert": new_wishlist},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        wishlist = await db.wishlists.find_one({"user_id": user_id}, {"_id": 0})
     return wishlist
 
 @api_router.post("/wishlist/{user_id}/add")
 async def add_to_wishlist(user_id: str, item: WishlistItem):
-    wishlist = await db.wishlists.find_one({"user_id": user_id}, {"_id": 0})
-    if not wishlist:
-        wishlist = Wishlist(user_id=user_id, items=[item.model_dump()])
-        await db.wishlists.insert_one(wishlist.model_dump())
-    else:
-        items = wishlist.get("items", [])
-        if not any(i["product_id"] == item.product_id for i in items):
-            items.append(item.model_dump())
-            await db.wishlists.update_one(
-                {"user_id": user_id},
-                {"$set": {"items": items}}
-            )
+    await upsert_wishlist(user_id, {
+        "$setOnInsert": {"id": str(uuid.uuid4())},
+        "$addToSet": {"items": item.model_dump()},
+    })
     
     return {"message": "Item added to wishlist"}
 
 @api_router.delete("/wishlist/{user_id}/item/{product_id}")
 async def remove_from_wishlist(user_id: str, product_id: str):
-    wishlist = await db.wishlists.find_one({"user_id": user_id}, {"_id": 0})
-    if not wishlist:
-        raise HTTPException(status_code=404, detail="Wishlist not found")
-    
-    items = wishlist.get("items", [])
-    items = [item for item in items if item["product_id"] != product_id]
-    
-    await db.wishlists.update_one(
+    result = await db.wishlists.update_one(
         {"user_id": user_id},
-        {"$set": {"items": items}}
+        {"$pull": {"items": {"product_id": product_id}}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Wishlist not found")
     
     return {"message": "Item removed from wishlist"}
 
 # Review Routes
+REVIEW_PROJECTION = lean_projection(Review)
+REVIEW_SORT = [("created_at", -1), ("id", -1)]
+
 @api_router.get("/reviews/product/{product_id}", response_model=List[Review])
-async def get_product_reviews(product_id: str):
-    reviews = await db.reviews.find({"product_id": product_id}, {"_id": 0}).to_list(1000)
-    for review in reviews:
-        if isinstance(review.get('created_at'), str):
-            review['created_at'] = datetime.fromisoformat(review['created_at'])
-    return reviews
+async def get_product_reviews(
+    request: Request,
+    product_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """Newest reviews first; pass `X-Next-Cursor` back as `cursor` for older ones."""
+    query = {"product_id": product_id}
+    if cursor:
+        query.update(keyset_filter(REVIEW_SORT, decode_cursor(cursor, REVIEW_SORT, Review)))
+    reviews = await catalog_db.reviews.find(query, REVIEW_PROJECTION).sort(REVIEW_SORT).to_list(limit + 1)
+    page, next_cursor = paginate(reviews, REVIEW_SORT, limit)
+    rendered = render_json(page, None if FAST_READS else List[Review])
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return conditional_response(request, rendered, REVIEWS_CACHE, headers)
 
 @api_router.post("/reviews", response_model=Review)
 async def create_review(review: ReviewCreate):
     if review.rating < 1 or review.rating > 5:
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
     
+    # Count the rating first: it doubles as the product existence check
+    if await record_rating(db.products, review.product_id, review.rating) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
     review_obj = Review(**review.model_dump())
-    doc = review_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.reviews.insert_one(doc)
+    await db.reviews.insert_one(review_obj.model_dump())
+    catalog_cache.invalidate()
     return review_obj
 
+# Coupon Routes
+@api_router.post("/coupons/validate", response_model=CouponValidation)
+async def validate_coupon(request: CouponValidationRequest):
+    try:
+        coupon = await coupons.get_coupon(db, request.code)
+        lines = prices = None
+        if request.items:
+            items = [item.model_dump(exclude={"product_name", "price"}) for item in request.items]
+            prices = await price_book.lookup(db.products, [item["product_id"] for item in items])
+            lines, _ = price_items([item for item in items if item["product_id"] in prices], prices)
+        quote = coupon.evaluate(lines, prices)
+        await coupons.check_user_limit(db, coupon, request.user_id)
+    except coupons.CouponError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return CouponValidation(
+        code=coupon.code,
+        discount_type=coupon.discount_type,
+        discount_percent=coupon.discount_percent,
+        discount_amount=coupon.discount_amount,
+        max_discount=coupon.max_discount,
+        min_order_value=coupon.min_order_value,
+        discount=quote.discount,
+        subtotal=quote.subtotal if lines is not None else None,
+    )
+
+async def release_order_coupon(order_id: str):
+    """Hand back the coupon use of an order that will not be paid."""
+    order = await db.orders.find_one_and_update(
+        {"id": order_id, "coupon_redeemed": True},
+        {"$set": {"coupon_redeemed": False}},
+        projection={"_id": 0, "coupon_code": 1, "user_id": 1},
+    )
+    if order:
+        await coupons.release(db, order["coupon_code"], order["user_id"])
+
+async def reclaim_order_coupon(order: dict):
+    """Count the coupon again for an order paid after its use was handed back."""
+    if not order.get("coupon_code") or order.get("coupon_redeemed", True):
+        return
+    if await db.orders.find_one_and_update(
+        {"id": order["id"], "coupon_redeemed": False}, {"$set": {"coupon_redeemed": True}}, projection={"_id": 1}
+    ):
+        await coupons.record_use(db, order["coupon_code"], order["user_id"])
+
+# Background Jobs
+# Analytics jobs carry an event_id so a retried job is counted once
+@job_queue.handler("record_order_created")
+async def record_order_created(order: dict, event_id: str):
+    await analytics.record_order_created(db, order, event_id)
+
+@job_queue.handler("record_order_paid")
+async def record_order_paid(order: dict, order_status: str, event_id: str):
+    await analytics.record_order_paid(db, order, order_status, event_id)
+
+@job_queue.handler("record_payment_status_change")
+async def record_payment_status_change(old: str, new: str, event_id: str):
+    await analytics.record_payment_status_change(db, old, new, event_id)
+
+@job_queue.handler("record_order_status_change")
+async def record_order_status_change(old: str, new: str, event_id: str):
+    await analytics.record_order_status_change(db, old, new, event_id)
+
+@job_queue.handler("send_order_confirmation")
+async def send_order_confirmation(order_id: str):
+    """Queue the confirmation message for a paid order, once per order."""
+    order = await db.orders.find_one(
+        {"id": order_id}, {"_id": 0, "user_id": 1, "order_number": 1, "total": 1, "shipping_address": 1}
+    )
+    if order is None:
+        return
+    await db.notifications.update_one(
+        {"_id": f"order-confirmation:{order_id}"},
+        {"$setOnInsert": {
+            "kind": "order_confirmation",
+            "order_id": order_id,
+            "user_id": order["user_id"],
+            "phone": order["shipping_address"]["phone"],
+            "message": f"Your order {order['order_number']} of ₹{order['total']:g} is confirmed.",
+            "status": "pending",
+            "created_at": datetime.now(timezone.utc),
+        }},
+        upsert=True,
+    )
+
 # Order Routes
+ORDER_PROJECTION = lean_projection(Order)
+
 @api_router.post("/orders/create", response_model=Order)
 async def create_order(order: OrderCreate):
+    items = [item.model_dump(exclude={"product_name", "price"}) for item in order.items]
+    prices = await price_book.lookup(db.products, [item["product_id"] for item in items])
+    unknown = [item["product_id"] for item in items if item["product_id"] not in prices]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Product {unknown[0]} not found")
+    items, subtotal = price_items(items, prices)
+
+    coupon, discount = None, 0
+    if order.coupon_code:
+        try:
+            coupon = await coupons.get_coupon(db, order.coupon_code)
+            discount = coupon.evaluate(items, prices).discount
+            await coupons.redeem(db, coupon, order.user_id)
+        except coupons.CouponError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    order_obj = Order(
+        user_id=order.user_id,
+        items=items,
+        shipping_address=order.shipping_address,
+        subtotal=subtotal,
+        discount=discount,
+        total=round(subtotal - discount, 2),
+        coupon_code=coupon.code if coupon else None,
+    )
+
+    try:
+        if await inventory.reserve(db, order_obj.id, order_obj.items):
+            catalog_cache.invalidate()
+    except inventory.OutOfStock as e:
+        if coupon:
+            await coupons.release(db, coupon.code, order.user_id)
+        if e.available is None:
+            raise HTTPException(status_code=404, detail=f"Product {e.product_id} not found")
+        raise HTTPException(status_code=409, detail=f"Only {e.available} left in stock for product {e.product_id}")
+
     # Create Razorpay order
-    amount = int(order.total * 100)  # Convert to paise
+    amount = round(order_obj.total * 100)  # Convert to paise
     try:
-        razorpay_order = razorpay_client.order.create({
-            "amount": amount,
-            "currency": "INR",
-            "payment_capture": 1
-        })
-    except Exception as e:
-        # If Razorpay is not configured, continue without it
-        razorpay_order = {"id": None}
+        razorpay_order = await payment_gateway.create_order(amount, currency="INR", receipt=order_obj.id)
+        order_obj.razorpay_order_id = razorpay_order.get("id")
+    except PaymentGatewayError as e:
+        # If Razorpay is not configured or unavailable, continue without it
+        logger.warning("Payment gateway order creation failed: %s", e)
     
-    order_obj = Order(**order.model_dump(), razorpay_order_id=razorpay_order.get("id"))
     doc = order_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    await db.orders.insert_one(doc)
+    # Cleared by whichever path hands the coupon use back, so it happens once
+    doc["coupon_redeemed"] = coupon is not None
+    try:
+        await db.orders.insert_one(doc)
+    except Exception:
+        await inventory.release(db, order_obj.id)
+        if coupon:
+            await coupons.release(db, coupon.code, order.user_id)
+        raise
+    if not order_obj.razorpay_order_id:
+        # No online payment will follow (gateway unconfigured or down) and the
+        # shopper is shown the order as placed, so the hold must not expire
+        await inventory.commit(db, order_obj.id)
+    await job_queue.enqueue("record_order_created", order=doc, event_id=f"order-created:{order_obj.id}")
     
     return order_obj
 
 @api_router.post("/orders/verify-payment")
 async def verify_payment(payment: PaymentVerification):
-    try:
-        razorpay_client.utility.verify_payment_signature({
-            'razorpay_order_id': payment.razorpay_order_id,
-            'razorpay_payment_id': payment.razorpay_payment_id,
-            'razorpay_signature': payment.razorpay_signature
-        })
-        
-        # Update order status
-        await db.orders.update_one(
-            {"id": payment.order_id},
-            {"$set": {
-                "payment_status": PaymentStatus.COMPLETED.value,
-                "order_status": OrderStatus.CONFIRMED.value,
-                "razorpay_payment_id": payment.razorpay_payment_id,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        return {"message": "Payment verified successfully"}
-    except Exception as e:
-        await db.orders.update_one(
-            {"id": payment.order_id},
+    verified = payment_gateway.verify_payment_signature(
+        payment.razorpay_order_id, payment.razorpay_payment_id, payment.razorpay_signature
+    )
+    # Only unpaid orders transition, so a replayed verification is counted once;
+    # the signature covers the gateway order, so it must be this order's
+    unpaid = {
+        "id": payment.order_id,
+        "razorpay_order_id": payment.razorpay_order_id,
+        "payment_status": {"$ne": PaymentStatus.COMPLETED.value},
+    }
+    if not verified:
+        before = await db.orders.find_one_and_update(
+            unpaid,
             {"$set": {
                 "payment_status": PaymentStatus.FAILED.value,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
+                "updated_at": datetime.now(timezone.utc)
+            }},
+            projection={"_id": 0, "payment_status": 1},
+            return_document=ReturnDocument.BEFORE,
         )
+        if before:
+            await job_queue.enqueue("record_payment_status_change", old=before["payment_status"],
+                                    new=PaymentStatus.FAILED.value, event_id=uuid.uuid4().hex)
+            if await inventory.release(db, payment.order_id):
+                catalog_cache.invalidate()
+            await release_order_coupon(payment.order_id)
         raise HTTPException(status_code=400, detail="Payment verification failed")
 
+    # Update order status
+    before = await db.orders.find_one_and_update(
+        unpaid,
+        {"$set": {
+            "payment_status": PaymentStatus.COMPLETED.value,
+            "order_status": OrderStatus.CONFIRMED.value,
+            "razorpay_payment_id": payment.razorpay_payment_id,
+            "updated_at": datetime.now(timezone.utc)
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before:
+        # Inline, not a job: until it runs the sweeper could hand the stock back
+        if not await inventory.commit(db, payment.order_id):
+            # Paid, but its stock went to someone else meanwhile
+            await db.orders.update_one({"id": payment.order_id}, {"$set": {"stock_shortfall": True}})
+        await reclaim_order_coupon(before)
+        await job_queue.enqueue("record_order_paid", order=before, order_status=OrderStatus.CONFIRMED.value,
+                                event_id=f"order-paid:{payment.order_id}")
+        await job_queue.enqueue("send_order_confirmation", order_id=payment.order_id)
+    # Nothing matched: fine for a replay of this order's payment, otherwise
+    # the signed gateway order is not this order's
+    elif not await db.orders.find_one(
+        {"id": payment.order_id, "razorpay_order_id": payment.razorpay_order_id}, {"_id": 1}
+    ):
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    return {"message": "Payment verified successfully"}
+
 @api_router.get("/orders/user/{user_id}", response_model=List[Order])
 async def get_user_orders(user_id: str):
-    orders = await db.orders.find({"user_id": user_id}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order.get('updated_at'), str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
+    orders = await db.orders.find({"user_id": user_id}, ORDER_PROJECTION).sort("created_at", -1).to_list(1000)
+    if FAST_READS:
+        return FastJSONResponse(orders)
     return orders
 
 @api_router.get("/orders/{order_id}", response_model=Order)
@@ -649,32 +1234,90 @@ async def get_order(order_id: str):
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    if isinstance(order.get('created_at'), str):
-        order['created_at'] = datetime.fromisoformat(order['created_at'])
-    if isinstance(order.get('updated_at'), str):
-        order['updated_at'] = datetime.fromisoformat(order['updated_at'])
     return order
 
+ORDER_SORT = [("created_at", -1), ("id", -1)]
+
+def stored_timestamp(value: datetime) -> datetime:
+    """Normalise a query datetime to the aware UTC datetimes timestamps are stored as."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def build_order_filter(status: Optional[OrderStatus], payment_status: Optional[PaymentStatus],
+                       created_from: Optional[datetime], created_to: Optional[datetime]) -> dict:
+    query = {}
+    if status:
+        query["order_status"] = status.value
+    if payment_status:
+        query["payment_status"] = payment_status.value
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = stored_timestamp(created_from)
+        if created_to:
+            query["created_at"]["$lt"] = stored_timestamp(created_to)
+    return query
+
+async def stream_ndjson(cursor):
+    async for doc in cursor:
+        yield ndjson_line(doc)
+
 @api_router.get("/orders", response_model=List[Order])
-async def get_all_orders():
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order.get('updated_at'), str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
-    return orders
+async def get_all_orders(
+    response: Response,
+    status: Optional[OrderStatus] = None,
+    payment_status: Optional[PaymentStatus] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    format: ExportFormat = ExportFormat.JSON,
+):
+    query = build_order_filter(status, payment_status, created_from, created_to)
+    if cursor:
+        after = keyset_filter(ORDER_SORT, decode_cursor(cursor, ORDER_SORT, Order))
+        query = {"$and": [query, after]} if query else after
+
+    if format == ExportFormat.NDJSON:
+        # Full dump: stream straight off the Motor cursor without buffering
+        orders_cursor = db.orders.find(query, ORDER_PROJECTION).sort(ORDER_SORT).batch_size(500)
+        return StreamingResponse(
+            stream_ndjson(orders_cursor),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": "attachment; filename=orders.ndjson"},
+        )
+
+    orders = await db.orders.find(query, ORDER_PROJECTION).sort(ORDER_SORT).limit(limit + 1).to_list(limit + 1)
+    page, next_cursor = paginate(orders, ORDER_SORT, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    if FAST_READS:
+        return FastJSONResponse(page, headers=headers)
+    response.headers.update(headers)
+    return page
 
 @api_router.put("/orders/{order_id}/status")
 async def update_order_status(order_id: str, status: OrderStatus):
-    result = await db.orders.update_one(
+    before = await db.orders.find_one_and_update(
         {"id": order_id},
-        {"$set": {"order_status": status.value, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"order_status": status.value, "updated_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0, "order_status": 1},
+        return_document=ReturnDocument.BEFORE,
     )
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Order not found")
+    if status == OrderStatus.CANCELLED:
+        if await inventory.release(db, order_id, include_committed=True):
+            catalog_cache.invalidate()
+        await release_order_coupon(order_id)
+    await job_queue.enqueue("record_order_status_change", old=before["order_status"], new=status.value,
+                            event_id=uuid.uuid4().hex)
     return {"message": "Order status updated"}
 
+@api_router.get("/admin/analytics")
+async def get_sales_analytics(days: int = Query(30, ge=1, le=366), top: int = Query(10, ge=1, le=50)):
+    return await analytics.get_dashboard(db, days=days, top=top)
+
 # Get Razorpay Key for frontend
 @api_router.get("/config/razorpay")
 async def get_razorpay_key():
@@ -690,7 +1333,23 @@ app.add_middleware(
     allow_origins=["http://localhost:3000"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
+)
+
+# Added last so it is outermost and sees every response body
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.environ.get("GZIP_LEVEL", "6")),
+    brotli_quality=int(os.environ.get("BROTLI_QUALITY", "4")),
 )
+# Outermost: times the whole request, compression included
+app.add_middleware(MetricsMiddleware)
+
+# Prometheus scrape target; outside /api so the public ingress does not expose it
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # Configure logging
 logging.basicConfig(
@@ -698,7 +1357,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
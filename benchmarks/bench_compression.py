@@ -0,0 +1,77 @@
+"""Bytes on the wire and CPU cost of each compression setting per route.
+
+Renders representative bodies for the heavy routes (product pages, order
+exports, reviews, categories), pushes each through ``CompressionMiddleware``
+at several gzip levels and brotli qualities, and reports the compressed
+size, ratio and milliseconds of compression CPU per response.
+
+    python benchmarks/bench_compression.py --iterations 50
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from bench_serialization import order_row, product_row, review_row
+from common import use_backend
+
+SETTINGS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("br", 1), ("br", 4), ("br", 11)]
+
+
+async def compressed_size(middleware_cls, body: bytes, media_type: str, encoding: str, level: int) -> int:
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", media_type.encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = middleware_cls(app, minimum_size=0, gzip_level=level, brotli_quality=level)
+    scope = {"type": "http", "headers": [(b"accept-encoding", encoding.encode())]}
+    await middleware(scope, None, send)
+    return sum(len(m.get("body", b"")) for m in sent if m["type"] == "http.response.body")
+
+
+async def measure(middleware_cls, body, media_type, encoding, level, iterations):
+    size = await compressed_size(middleware_cls, body, media_type, encoding, level)
+    start = time.process_time()
+    for _ in range(iterations):
+        await compressed_size(middleware_cls, body, media_type, encoding, level)
+    return size, (time.process_time() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    use_backend()
+    import compression
+    from compression import CompressionMiddleware
+    from lean import dumps, ndjson_line
+
+    now = datetime.now(timezone.utc)
+    routes = [
+        ("GET /products (48)", "application/json", dumps([product_row(i, now) for i in range(48)])),
+        ("GET /products/{id}", "application/json", dumps(product_row(0, now))),
+        ("GET /reviews (50)", "application/json", dumps([review_row(i, now) for i in range(50)])),
+        ("GET /admin/orders (100)", "application/json", dumps([order_row(i, now) for i in range(100)])),
+        ("orders NDJSON (1000)", "application/x-ndjson", b"".join(ndjson_line(order_row(i, now)) for i in range(1000))),
+    ]
+    settings = [s for s in SETTINGS if s[0] == "gzip" or compression.brotli is not None]
+    if compression.brotli is None:
+        print("brotli not installed; reporting gzip only\n")
+
+    print(f"{'route':<26}{'setting':<9}{'bytes':>10}{'ratio':>8}{'ms/resp':>9}")
+    for label, media_type, body in routes:
+        print(f"{label:<26}{'identity':<9}{len(body):>10}{1:>8.2f}{0:>9.3f}")
+        for encoding, level in settings:
+            size, ms = asyncio.run(measure(CompressionMiddleware, body, media_type, encoding, level, args.iterations))
+            print(f"{'':<26}{f'{encoding}-{level}':<9}{size:>10}{len(body) / size:>8.2f}{ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Latency of an unrelated endpoint while a burst of bcrypt checks runs.
+
+Probes ``GET /api/`` every few milliseconds through the ASGI app while
+``--logins`` password verifications run either inline on the event loop
+(the old behaviour) or on the password hashing pool. No MongoDB needed.
+
+    python benchmarks/bench_password_hashing.py --logins 40 --rounds 12
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from common import percentile, probe, use_backend
+
+
+async def run(server, mode, logins, hashed):
+    async def login():
+        if mode == "inline":
+            server.verify_password("benchmark-password", hashed)
+        elif mode == "pool":
+            await server.verify_password_async("benchmark-password", hashed)
+
+    samples, stop = [], asyncio.Event()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        prober = asyncio.create_task(probe(client, stop, samples))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0.05)
+        stop.set()
+        await prober
+    return samples, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt work factor")
+    parser.add_argument("--workers", type=int, default=4, help="password hashing pool size")
+    args = parser.parse_args()
+
+    use_backend(BCRYPT_ROUNDS=str(args.rounds), PASSWORD_HASH_WORKERS=str(args.workers))
+    import server
+
+    hashed = server.get_password_hash("benchmark-password")
+    print(f"{args.logins} logins, bcrypt rounds={args.rounds}, pool workers={args.workers}")
+    print(f"{'mode':<8}{'probes':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'burst s':>10}")
+    for mode in ("idle", "inline", "pool"):
+        samples, elapsed = await run(server, mode, args.logins, hashed)
+        print(f"{mode:<8}{len(samples):>8}{percentile(samples, 50):>10.2f}"
+              f"{percentile(samples, 99):>10.2f}{max(samples):>10.2f}{elapsed:>10.2f}")
+    server.password_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
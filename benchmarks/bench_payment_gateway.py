@@ -0,0 +1,60 @@
+"""Checkout throughput with a blocking versus an async payment gateway call.
+
+Simulates ``--checkouts`` concurrent gateway order creations that each
+take ``--latency-ms``: once as a blocking call on the event loop (how the
+synchronous Razorpay SDK behaved) and once through ``FakePaymentGateway``.
+A probe measures ``GET /api/`` latency meanwhile. Fully offline.
+
+    python benchmarks/bench_payment_gateway.py --checkouts 50 --latency-ms 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from common import percentile, probe, use_backend
+
+
+async def run(server, gateway, mode, checkouts, latency):
+    async def checkout(i):
+        if mode == "blocking":
+            time.sleep(latency)
+        else:
+            await gateway.create_order(100_00, receipt=f"bench-{i}")
+
+    samples, stop = [], asyncio.Event()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        prober = asyncio.create_task(probe(client, stop, samples))
+        await asyncio.sleep(0.02)
+        start = time.perf_counter()
+        await asyncio.gather(*(checkout(i) for i in range(checkouts)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+    return samples, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkouts", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    use_backend(PAYMENT_GATEWAY="fake")
+    import server
+    from payments import FakePaymentGateway
+
+    latency = args.latency_ms / 1000
+    gateway = FakePaymentGateway(latency=latency)
+    print(f"{args.checkouts} concurrent checkouts, gateway latency {args.latency_ms:.0f} ms")
+    print(f"{'mode':<10}{'checkouts/s':>13}{'probe p50':>11}{'probe p99':>11}")
+    for mode in ("blocking", "async"):
+        samples, elapsed = await run(server, gateway, mode, args.checkouts, latency)
+        print(f"{mode:<10}{args.checkouts / elapsed:>13.1f}"
+              f"{percentile(samples, 50):>11.2f}{percentile(samples, 99):>11.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
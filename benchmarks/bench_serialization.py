@@ -0,0 +1,101 @@
+"""Per-worker serialisation cost of the validated versus the lean read path.
+
+For product, order and review pages it renders the same rows twice: the
+way FastAPI does for ``response_model`` (validate every row, dump to JSON
+mode, ``json.dumps``) and the ``FAST_READS`` way (``FastJSONResponse`` over
+schema-shaped rows). It first checks that both produce identical JSON,
+then reports the rendering-only requests/sec one worker could sustain.
+That the endpoints' projections turn stored documents into such rows is
+checked by ``tests/test_lean.py``.
+
+    python benchmarks/bench_serialization.py --iterations 300
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from common import use_backend
+
+
+def product_row(i, now):
+    return {
+        "id": str(uuid.uuid4()), "name": f"Handmade Chappal {i}", "slug": f"handmade-chappal-{i}",
+        "description": "Handcrafted chappal with intricate zari embroidery and a cushioned sole. " * 3,
+        "price": 1999.0, "discount_price": 1499.0 if i % 2 else None, "category_id": "cat-wedding",
+        "images": [f"https://images.unsplash.com/photo-17691039487{i:02d}?crop=entropy&cs=srgb&fm=jpg&q=85"] * 3,
+        "sizes": ["5", "6", "7", "8", "9"], "colors": ["Red Gold", "Maroon Gold", "Pink Gold"],
+        "care_instructions": "Wipe with dry cloth.", "in_stock": True, "stock_quantity": 25,
+        "featured": bool(i % 3 == 0), "rating_count": i % 4, "rating_sum": 4 * (i % 4),
+        "rating_avg": 4.0 if i % 4 else 0.0, "rating_histogram": {"1": 0, "2": 0, "3": 0, "4": i % 4, "5": 0},
+        "created_at": now - timedelta(minutes=i),
+    }
+
+
+def order_row(i, now):
+    return {
+        "id": str(uuid.uuid4()), "order_number": f"ORD{i:08X}", "user_id": f"user-{i % 50}",
+        "items": [{"product_id": str(uuid.uuid4()), "product_name": "Royal Bridal Chappal", "quantity": 1 + j,
+                   "size": "7", "color": "Red Gold", "price": 1999.0} for j in range(3)],
+        "shipping_address": {"name": "Asha Patel", "phone": "9876543210", "address_line1": "12 Station Road",
+                             "address_line2": None, "city": "Mahemdavad", "state": "Gujarat", "pincode": "387130"},
+        "subtotal": 11994.0, "discount": 0.0, "total": 11994.0, "payment_status": "completed",
+        "order_status": "confirmed", "razorpay_order_id": f"order_{i:014d}", "razorpay_payment_id": None,
+        "coupon_code": "FESTIVE20" if i % 5 == 0 else None,
+        "created_at": now - timedelta(minutes=i), "updated_at": now - timedelta(minutes=i),
+    }
+
+
+def review_row(i, now):
+    return {
+        "id": str(uuid.uuid4()), "product_id": "prod-wed-1", "user_id": f"user-{i}", "user_name": "Asha",
+        "rating": 1 + i % 5, "comment": "Beautiful work and very comfortable.", "created_at": now - timedelta(hours=i),
+    }
+
+
+def validated_render(adapter, rows) -> bytes:
+    # What FastAPI does for response_model: validate, dump in JSON mode, json.dumps
+    content = adapter.dump_python(adapter.validate_python(rows), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def per_second(fn, iterations) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    use_backend()
+    from pydantic import TypeAdapter
+    import server
+    from lean import FastJSONResponse
+
+    now = datetime.now(timezone.utc).replace(microsecond=123000)
+    cases = [
+        ("products x48", server.Product, [product_row(i, now) for i in range(48)]),
+        ("orders x100", server.Order, [order_row(i, now) for i in range(100)]),
+        ("reviews x50", server.Review, [review_row(i, now) for i in range(50)]),
+    ]
+
+    print(f"{'page':<14}{'validated req/s':>17}{'lean req/s':>12}{'speedup':>9}")
+    for label, model, rows in cases:
+        adapter = TypeAdapter(List[model])
+        validated = validated_render(adapter, rows)
+        lean = FastJSONResponse(rows).body
+        if json.loads(validated) != json.loads(lean):
+            raise SystemExit(f"{label}: lean output differs from the {model.__name__} contract")
+        slow = per_second(lambda: validated_render(adapter, rows), args.iterations)
+        fast = per_second(lambda: FastJSONResponse(rows).body, args.iterations)
+        print(f"{label:<14}{slow:>17.0f}{fast:>12.0f}{fast / slow:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Shared helpers for the scripts in this directory."""
+import asyncio
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Sequence
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+
+
+def use_backend(**env: str) -> None:
+    """Make ``import server`` work from here without a backend/.env file."""
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "jasubhai_bench")
+    os.environ.setdefault("ENSURE_INDEXES", "0")
+    for key, value in env.items():
+        os.environ[key] = value
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+async def probe(client, stop: asyncio.Event, samples: List[float]) -> None:
+    """Time ``GET /api/`` in milliseconds until ``stop`` is set, to show event loop stalls."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/")
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
@@ -0,0 +1,323 @@
+"""Local load test: the whole API in-process under a weighted scenario mix.
+
+Runs the FastAPI app through its lifespan (startup index build, shutdown
+cleanup) over ``httpx.ASGITransport``, against a throwaway database on a
+local mongod (``MONGO_URL``, default ``mongodb://localhost:27017``) or,
+with ``--mongomock``, an in-memory ``mongomock_motor`` stand-in. Payments
+go through ``FakePaymentGateway``, so checkouts need no network.
+
+``--users`` virtual users loop over weighted scenarios (browse, product
+detail, add to cart, checkout, admin dashboard) for ``--duration``
+seconds. The report shows requests/sec, errors and p50/p95/p99 latency per
+endpoint. Every run is saved to ``benchmarks/results/<commit>.json`` and
+compared with the previous result, or with ``--compare``:
+
+    python benchmarks/loadtest.py --duration 30 --users 25
+    python benchmarks/loadtest.py --compare results/3f2a1bc.json --fail-on-regression
+    python benchmarks/loadtest.py --mix browse=1,checkout=1
+
+mongomock lacks several operators the API relies on (``$convert``,
+``$text``, ``$literal`` inside pipeline updates), so some endpoints error
+there; use it to smoke-test the harness, and a real mongod for numbers.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+from common import percentile, use_backend
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+DEFAULT_MIX = {"browse": 45, "detail": 30, "cart": 12, "checkout": 8, "admin": 5}
+
+CATEGORIES = ["wedding", "party", "daily", "festive", "designer"]
+COLORS = ["Red Gold", "Maroon", "Pink Gold", "Black", "Tan", "Silver"]
+WORDS = ["royal", "bridal", "kolhapuri", "juti", "mojari", "handmade", "zari", "leather", "classic", "embroidered"]
+
+SHIPPING = {"name": "Load Test", "phone": "9876543210", "address_line1": "12 Station Road",
+            "city": "Mahemdavad", "state": "Gujarat", "pincode": "387130"}
+
+
+def git_revision() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             check=True, cwd=RESULTS_DIR.parent).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, cwd=RESULTS_DIR.parent).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def seed(db, products: int, users: int, rng: random.Random) -> dict:
+    import ratings
+
+    for name in ("categories", "products", "reviews", "users", "carts", "orders",
+                 "sales_summary", "sales_daily", "sales_products"):
+        await db[name].delete_many({})
+    now = datetime.now(timezone.utc)
+    await db.categories.insert_many([
+        {"id": f"cat-{slug}", "name": slug.title(), "slug": slug, "description": None, "image_url": None,
+         "created_at": now} for slug in CATEGORIES
+    ])
+    catalog = []
+    for i in range(products):
+        name = " ".join(rng.sample(WORDS, 3)).title() + f" {i}"
+        price = float(rng.randrange(400, 4000, 50))
+        catalog.append({
+            "id": str(uuid.uuid4()), "name": name, "slug": name.lower().replace(" ", "-"),
+            "description": f"Handcrafted {name.lower()} with a cushioned sole and hand-stitched upper.",
+            "price": price, "discount_price": price - 200 if i % 3 == 0 else None,
+            "category_id": f"cat-{CATEGORIES[i % len(CATEGORIES)]}",
+            "images": [f"https://images.unsplash.com/photo-{1700000000000 + i}?crop=entropy&fm=jpg&q=85"] * 3,
+            "sizes": ["5", "6", "7", "8", "9"], "colors": rng.sample(COLORS, 3),
+            "care_instructions": "Wipe with a dry cloth.", "in_stock": True, "stock_quantity": 1_000_000,
+            "featured": i % 8 == 0, "created_at": now - timedelta(minutes=i),
+        })
+    await db.products.insert_many([dict(p) for p in catalog])
+    reviews = [
+        {"id": str(uuid.uuid4()), "product_id": p["id"], "user_id": f"seed-user-{j}", "user_name": "Asha",
+         "rating": 1 + j % 5, "comment": "Beautiful work and very comfortable.",
+         "created_at": now - timedelta(hours=j)}
+        for p in catalog[:200] for j in range(5)
+    ]
+    if reviews:
+        await db.reviews.insert_many(reviews)
+    await ratings.backfill(db)
+    return {"products": catalog, "users": [f"loadtest-user-{i}" for i in range(users)]}
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.samples[name].append((time.perf_counter() - start) * 1000)
+        if not ok:
+            self.errors[name] += 1
+            return None
+        return response
+
+
+async def browse(client, rec, data, rng, user_id):
+    await rec.call(client, "GET /categories", "GET", "/api/categories")
+    params = {"limit": 24}
+    roll = rng.random()
+    if roll < 0.3:
+        params["category_id"] = f"cat-{rng.choice(CATEGORIES)}"
+    elif roll < 0.5:
+        params["search"] = rng.choice(WORDS)
+    response = await rec.call(client, "GET /products", "GET", "/api/products", params=params)
+    cursor = response.headers.get("x-next-cursor") if response is not None else None
+    if cursor and rng.random() < 0.4:
+        await rec.call(client, "GET /products (next page)", "GET", "/api/products", params={**params, "cursor": cursor})
+    if "search" in params:
+        await rec.call(client, "GET /products/facets", "GET", "/api/products/facets", params={"search": params["search"]})
+
+
+async def detail(client, rec, data, rng, user_id):
+    product = rng.choice(data["products"][:200] if rng.random() < 0.8 else data["products"])
+    if rng.random() < 0.5:
+        await rec.call(client, "GET /products/{id}", "GET", f"/api/products/{product['id']}")
+    else:
+        await rec.call(client, "GET /products/slug/{slug}", "GET", f"/api/products/slug/{product['slug']}")
+    await rec.call(client, "GET /reviews/product/{id}", "GET", f"/api/reviews/product/{product['id']}")
+
+
+async def cart(client, rec, data, rng, user_id):
+    product = rng.choice(data["products"])
+    item = {"product_id": product["id"], "quantity": 1, "size": "7", "color": product["colors"][0]}
+    await rec.call(client, "POST /cart/{user}/add", "POST", f"/api/cart/{user_id}/add", json=item)
+    await rec.call(client, "GET /cart/{user}/hydrated", "GET", f"/api/cart/{user_id}/hydrated")
+
+
+async def checkout(client, rec, data, rng, user_id):
+    import server
+
+    products = rng.sample(data["products"], 2)
+    items = [{"product_id": p["id"], "product_name": p["name"], "quantity": 1, "size": "7",
+              "color": p["colors"][0], "price": p["discount_price"] or p["price"]} for p in products]
+    subtotal = sum(item["price"] for item in items)
+    await rec.call(client, "GET /cart/{user}/hydrated", "GET", f"/api/cart/{user_id}/hydrated")
+    response = await rec.call(client, "POST /orders/create", "POST", "/api/orders/create", json={
+        "user_id": user_id, "items": items, "shipping_address": SHIPPING, "subtotal": subtotal, "total": subtotal,
+    })
+    if response is None:
+        return
+    order = response.json()
+    payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+    await rec.call(client, "POST /orders/verify-payment", "POST", "/api/orders/verify-payment", json={
+        "razorpay_order_id": order["razorpay_order_id"], "razorpay_payment_id": payment_id,
+        "razorpay_signature": server.payment_gateway.sign(order["razorpay_order_id"], payment_id),
+        "order_id": order["id"],
+    })
+    await rec.call(client, "DELETE /cart/{user}", "DELETE", f"/api/cart/{user_id}")
+
+
+async def admin(client, rec, data, rng, user_id):
+    await rec.call(client, "GET /admin/analytics", "GET", "/api/admin/analytics")
+    await rec.call(client, "GET /orders", "GET", "/api/orders", params={"limit": 50})
+
+
+SCENARIOS = {"browse": browse, "detail": detail, "cart": cart, "checkout": checkout, "admin": admin}
+
+
+async def virtual_user(client, rec, data, mix, deadline, think, seed_value):
+    rng = random.Random(seed_value)
+    user_id = rng.choice(data["users"])
+    names, weights = zip(*mix.items())
+    while time.perf_counter() < deadline:
+        await SCENARIOS[rng.choices(names, weights)[0]](client, rec, data, rng, user_id)
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+
+
+def summarise(rec: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for name in sorted(rec.samples):
+        samples = rec.samples[name]
+        endpoints[name] = {
+            "requests": len(samples), "errors": rec.errors[name], "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50), 2), "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+        }
+    everything = [s for samples in rec.samples.values() for s in samples]
+    total = {
+        "requests": len(everything), "errors": sum(rec.errors.values()), "rps": round(len(everything) / elapsed, 1),
+        "p50_ms": round(percentile(everything, 50), 2), "p95_ms": round(percentile(everything, 95), 2),
+        "p99_ms": round(percentile(everything, 99), 2),
+    }
+    return {"endpoints": endpoints, "total": total}
+
+
+def print_report(result: dict) -> None:
+    print(f"{'endpoint':<30}{'reqs':>7}{'err':>5}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        print(f"{name:<30}{s['requests']:>7}{s['errors']:>5}{s['rps']:>8.1f}"
+              f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose p95 grew, or whose throughput fell, by more than ``tolerance``."""
+    regressions = []
+    current = {**result["endpoints"], "TOTAL": result["total"]}
+    previous = {**baseline["endpoints"], "TOTAL": baseline["total"]}
+    print(f"\nvs {baseline['meta']['revision']} ({baseline['meta']['started_at']}):")
+    print(f"{'endpoint':<30}{'rps':>16}{'p95 ms':>18}")
+    for name, s in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        rps_change = (s["rps"] - old["rps"]) / old["rps"] if old["rps"] else 0.0
+        p95_change = (s["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        flag = ""
+        if p95_change > tolerance or rps_change < -tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<30}{old['rps']:>7.1f} ->{s['rps']:>6.1f}{old['p95_ms']:>8.1f} ->{s['p95_ms']:>7.1f}{flag}")
+    return regressions
+
+
+def load_baseline(ref: str, exclude: Path):
+    if ref:
+        path = Path(ref)
+        if not path.exists():
+            path = next(iter(sorted(RESULTS_DIR.glob(f"{ref}*.json"))), path)
+        return json.loads(path.read_text())
+    previous = sorted((p for p in RESULTS_DIR.glob("*.json") if p != exclude), key=lambda p: p.stat().st_mtime)
+    return json.loads(previous[-1].read_text()) if previous else None
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="seconds of measured load")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between scenarios per user")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. browse=45,detail=30,checkout=8")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", default="jasubhai_loadtest", help="database to (re)seed; it is wiped first")
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock_motor instead of a mongod")
+    parser.add_argument("--gateway-latency-ms", default="50", help="simulated payment gateway latency")
+    parser.add_argument("--compare", default="", help="baseline JSON path or revision prefix in results/")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative p95/rps change")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    use_backend(DB_NAME=args.db, PAYMENT_GATEWAY="fake", FAKE_GATEWAY_LATENCY_MS=args.gateway_latency_ms,
+                ENSURE_INDEXES="0" if args.mongomock else "1",
+                MONGO_WARM_CONNECTIONS="0" if args.mongomock else "4")
+    import logging
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # Every virtual user shares one client address, so fan-out warnings are noise here
+    logging.getLogger("metrics").setLevel(logging.ERROR)
+    import server
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        server.db = server.catalog_db = AsyncMongoMockClient(tz_aware=True)[args.db]
+
+    rng = random.Random(args.seed)
+    data = await seed(server.db, args.products, max(args.users, 1) * 4, rng)
+    rec = Recorder()
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=30) as client:
+            started_at = datetime.now(timezone.utc)
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*(
+                virtual_user(client, rec, data, args.mix, deadline, args.think_ms / 1000, args.seed * 1000 + i)
+                for i in range(args.users)
+            ))
+            elapsed = time.perf_counter() - start
+
+    result = summarise(rec, elapsed)
+    result["meta"] = {
+        "revision": git_revision(), "started_at": started_at.isoformat(timespec="seconds"),
+        "duration_s": round(elapsed, 1), "users": args.users, "mix": args.mix, "products": args.products,
+        "backend": "mongomock" if args.mongomock else "mongod", "gateway_latency_ms": float(args.gateway_latency_ms),
+    }
+    print_report(result)
+
+    path = RESULTS_DIR / f"{result['meta']['revision']}.json"
+    baseline = load_baseline(args.compare, exclude=path)
+    regressions = compare(result, baseline, args.tolerance) if baseline else []
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path.write_text(json.dumps(result, indent=2))
+        print(f"\nsaved {path.relative_to(RESULTS_DIR.parent)}")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(f"{len(regressions)} endpoint(s) regressed beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""Concurrent checkouts of one SKU must never sell more than its stock.
+
+Seeds a single product with ``--stock`` units, fires ``--checkouts``
+order creations for it at once through the ASGI app, and checks that:
+
+* accepted orders x quantity == stock taken, and stock never went negative;
+* every other checkout was refused with 409;
+* the held reservations add up to the stock taken;
+* once the holds expire, the sweeper hands every unit back.
+
+Exits non-zero on any violation, so it can gate CI against a real mongod:
+
+    python benchmarks/oversell.py --stock 50 --checkouts 500
+    python benchmarks/oversell.py --mongomock   # harness smoke test only
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from common import use_backend
+from loadtest import SHIPPING
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", type=int, default=50)
+    parser.add_argument("--checkouts", type=int, default=500)
+    parser.add_argument("--quantity", type=int, default=1, help="units per checkout")
+    parser.add_argument("--db", default="jasubhai_oversell")
+    parser.add_argument("--mongomock", action="store_true")
+    args = parser.parse_args()
+
+    use_backend(DB_NAME=args.db, PAYMENT_GATEWAY="fake", FAKE_GATEWAY_LATENCY_MS="0",
+                ENSURE_INDEXES="0" if args.mongomock else "1",
+                MONGO_WARM_CONNECTIONS="0" if args.mongomock else "4")
+    import logging
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("metrics").setLevel(logging.ERROR)
+    import inventory
+    import server
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        server.db = server.catalog_db = AsyncMongoMockClient(tz_aware=True)[args.db]
+    db = server.db
+
+    product_id = str(uuid.uuid4())
+    for name in ("products", "orders", "stock_reservations"):
+        await db[name].delete_many({})
+    await db.products.insert_one({
+        "id": product_id, "name": "Flash Sale Juti", "slug": "flash-sale-juti", "description": "One SKU.",
+        "price": 999.0, "category_id": "cat-festive", "in_stock": True, "stock_quantity": args.stock,
+        "created_at": datetime.now(timezone.utc),
+    })
+    item = {"product_id": product_id, "product_name": "Flash Sale Juti", "quantity": args.quantity,
+            "size": "7", "color": "Red", "price": 999.0}
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://oversell", timeout=60) as client:
+            async def checkout(i: int) -> int:
+                total = 999.0 * args.quantity
+                response = await client.post("/api/orders/create", json={
+                    "user_id": f"buyer-{i}", "items": [item], "shipping_address": SHIPPING,
+                    "subtotal": total, "total": total,
+                })
+                return response.status_code
+
+            statuses = Counter(await asyncio.gather(*(checkout(i) for i in range(args.checkouts))))
+
+        product = await db.products.find_one({"id": product_id}, {"_id": 0, "stock_quantity": 1, "in_stock": 1})
+        held = [r async for r in db.stock_reservations.find({"status": inventory.HELD}, {"_id": 0, "lines": 1})]
+        held_units = sum(line["quantity"] for r in held for line in r["lines"])
+        sold = statuses[200] * args.quantity
+        taken = args.stock - product["stock_quantity"]
+
+        print(f"checkouts: {dict(sorted(statuses.items()))}")
+        print(f"stock: {args.stock} -> {product['stock_quantity']} (in_stock={product['in_stock']}), "
+              f"sold {sold}, held {held_units}")
+        failures = []
+        if product["stock_quantity"] < 0:
+            failures.append("stock went negative")
+        if sold != taken:
+            failures.append(f"accepted orders hold {sold} units but stock dropped by {taken}")
+        if held_units != taken:
+            failures.append(f"reservations hold {held_units} units but stock dropped by {taken}")
+        if set(statuses) - {200, 409}:
+            failures.append(f"unexpected statuses {sorted(set(statuses) - {200, 409})}")
+        if args.stock // args.quantity <= args.checkouts and sold != args.stock // args.quantity * args.quantity:
+            failures.append(f"undersold: {sold} of {args.stock} units")
+
+        released = await inventory.sweep_expired(db, now=datetime.now(timezone.utc) + timedelta(days=1))
+        product = await db.products.find_one({"id": product_id}, {"_id": 0, "stock_quantity": 1})
+        print(f"after expiry: {released} reservations released, stock {product['stock_quantity']}")
+        if product["stock_quantity"] != args.stock:
+            failures.append(f"expiry left stock at {product['stock_quantity']}, expected {args.stock}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: no overselling")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
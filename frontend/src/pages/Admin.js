@@ -9,8 +9,10 @@ const API = `${BACKEND_URL}/api`;
 const Admin = () => {
   const [activeTab, setActiveTab] = useState('products');
   const [products, setProducts] = useState([]);
+  const [productsCursor, setProductsCursor] = useState(null);
   const [categories, setCategories] = useState([]);
   const [orders, setOrders] = useState([]);
+  const [ordersCursor, setOrdersCursor] = useState(null);
   const [showProductForm, setShowProductForm] = useState(false);
   const [showCategoryForm, setShowCategoryForm] = useState(false);
   const [editingProduct, setEditingProduct] = useState(null);
@@ -49,6 +51,7 @@ const Admin = () => {
           axios.get(`${API}/categories`)
         ]);
         setProducts(productsRes.data);
+        setProductsCursor(productsRes.headers['x-next-cursor'] || null);
         setCategories(categoriesRes.data);
       } else if (activeTab === 'categories') {
         const categoriesRes = await axios.get(`${API}/categories`);
@@ -56,12 +59,35 @@ const Admin = () => {
       } else if (activeTab === 'orders') {
         const ordersRes = await axios.get(`${API}/orders`);
         setOrders(ordersRes.data);
+        setOrdersCursor(ordersRes.headers['x-next-cursor'] || null);
       }
     } catch (error) {
       console.error('Error fetching data:', error);
     }
   };
 
+  const loadMoreProducts = async () => {
+    try {
+      const res = await axios.get(`${API}/products`, { params: { cursor: productsCursor } });
+      setProducts(prev => [...prev, ...res.data]);
+      setProductsCursor(res.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error loading more products:', error);
+      toast.error('Failed to load more products');
+    }
+  };
+
+  const loadMoreOrders = async () => {
+    try {
+      const res = await axios.get(`${API}/orders`, { params: { cursor: ordersCursor } });
+      setOrders(prev => [...prev, ...res.data]);
+      setOrdersCursor(res.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error loading more orders:', error);
+      toast.error('Failed to load more orders');
+    }
+  };
+
   const handleProductSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -76,11 +102,14 @@ const Admin = () => {
       };
 
       if (editingProduct) {
-        await axios.put(`${API}/products/${editingProduct}`, data);
+        // Updated in place so products on later pages stay in view
+        const res = await axios.put(`${API}/products/${editingProduct}`, data);
+        setProducts(prev => prev.map(p => (p.id === editingProduct ? res.data : p)));
         toast.success('Product updated successfully');
       } else {
         await axios.post(`${API}/products`, data);
         toast.success('Product created successfully');
+        fetchData();
       }
 
       setShowProductForm(false);
@@ -90,7 +119,6 @@ const Admin = () => {
         category_id: '', images: [''], sizes: [''], colors: [''],
         care_instructions: '', stock_quantity: '0', featured: false
       });
-      fetchData();
     } catch (error) {
       console.error('Error saving product:', error);
       toast.error('Failed to save product');
@@ -116,7 +144,7 @@ const Admin = () => {
     try {
       await axios.delete(`${API}/products/${id}`);
       toast.success('Product deleted');
-      fetchData();
+      setProducts(prev => prev.filter(p => p.id !== id));
     } catch (error) {
       console.error('Error deleting product:', error);
       toast.error('Failed to delete product');
@@ -146,7 +174,7 @@ const Admin = () => {
     try {
       await axios.put(`${API}/orders/${orderId}/status`, null, { params: { status } });
       toast.success('Order status updated');
-      fetchData();
+      setOrders(prev => prev.map(o => (o.id === orderId ? { ...o, order_status: status } : o)));
     } catch (error) {
       console.error('Error updating order:', error);
       toast.error('Failed to update order status');
@@ -394,6 +422,17 @@ const Admin = () => {
                 </div>
               ))}
             </div>
+            {productsCursor && (
+              <div className="text-center mt-8">
+                <button
+                  onClick={loadMoreProducts}
+                  className="border border-primary text-primary px-6 py-2 hover:bg-primary hover:text-white transition-colors"
+                  data-testid="load-more-products"
+                >
+                  Load more products
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -510,6 +549,17 @@ const Admin = () => {
                 </div>
               ))}
             </div>
+            {ordersCursor && (
+              <div className="text-center mt-8">
+                <button
+                  onClick={loadMoreOrders}
+                  className="border border-primary text-primary px-6 py-2 hover:bg-primary hover:text-white transition-colors"
+                  data-testid="load-more-orders"
+                >
+                  Load older orders
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
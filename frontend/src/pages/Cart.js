@@ -20,16 +20,13 @@ const Cart = () => {
   const fetchCart = async () => {
     try {
       const userId = localStorage.getItem('userId') || 'guest';
-      const cartRes = await axios.get(`${API}/cart/${userId}`);
+      const cartRes = await axios.get(`${API}/cart/${userId}/hydrated`);
       setCart(cartRes.data);
 
-      // Fetch product details
-      const productIds = [...new Set(cartRes.data.items.map(item => item.product_id))];
-      const productPromises = productIds.map(id => axios.get(`${API}/products/${id}`));
-      const productResponses = await Promise.all(productPromises);
+      // Product details come back inline with each cart line
       const productsMap = {};
-      productResponses.forEach(res => {
-        productsMap[res.data.id] = res.data;
+      cartRes.data.items.forEach(item => {
+        if (item.product) productsMap[item.product_id] = item.product;
       });
       setProducts(productsMap);
     } catch (error) {
@@ -57,12 +54,10 @@ const Cart = () => {
     if (newQuantity < 1) return;
     try {
       const userId = localStorage.getItem('userId') || 'guest';
-      await removeFromCart(item.product_id, item.size, item.color);
-      await axios.post(`${API}/cart/${userId}/add`, {
-        product_id: item.product_id,
-        quantity: newQuantity,
-        size: item.size,
-        color: item.color
+      await axios.put(`${API}/cart/${userId}/item/${item.product_id}`, {
+        quantity: newQuantity
+      }, {
+        params: { size: item.size, color: item.color }
       });
       fetchCart();
     } catch (error) {
@@ -43,7 +43,7 @@ const Checkout = () => {
     try {
       const userId = localStorage.getItem('userId') || 'guest';
       const [cartRes, configRes] = await Promise.all([
-        axios.get(`${API}/cart/${userId}`),
+        axios.get(`${API}/cart/${userId}/hydrated`),
         axios.get(`${API}/config/razorpay`)
       ]);
 
@@ -56,13 +56,10 @@ const Checkout = () => {
       setCart(cartRes.data);
       setRazorpayKeyId(configRes.data.key_id);
 
-      // Fetch product details
-      const productIds = [...new Set(cartRes.data.items.map(item => item.product_id))];
-      const productPromises = productIds.map(id => axios.get(`${API}/products/${id}`));
-      const productResponses = await Promise.all(productPromises);
+      // Product details come back inline with each cart line
       const productsMap = {};
-      productResponses.forEach(res => {
-        productsMap[res.data.id] = res.data;
+      cartRes.data.items.forEach(item => {
+        if (item.product) productsMap[item.product_id] = item.product;
       });
       setProducts(productsMap);
     } catch (error) {
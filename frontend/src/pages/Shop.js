@@ -7,9 +7,12 @@ import { toast } from 'sonner';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Default page size of GET /products
+const PAGE_SIZE = 48;
 
 const Shop = () => {
   const [products, setProducts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [categories, setCategories] = useState([]);
   const [selectedCategory, setSelectedCategory] = useState('all');
   const [searchQuery, setSearchQuery] = useState('');
@@ -43,6 +46,7 @@ const Shop = () => {
 
       const response = await axios.get(url);
       setProducts(response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Error fetching products:', error);
       toast.error('Failed to load products');
@@ -51,6 +55,20 @@ const Shop = () => {
     }
   };
 
+  const loadMore = async () => {
+    try {
+      const params = { cursor: nextCursor };
+      if (selectedCategory !== 'all') params.category_id = selectedCategory;
+      if (searchQuery) params.search = searchQuery;
+      const response = await axios.get(`${API}/products`, { params });
+      setProducts(prev => [...prev, ...response.data]);
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error loading more products:', error);
+      toast.error('Failed to load more products');
+    }
+  };
+
   const addToCart = async (productId) => {
     try {
       const userId = localStorage.getItem('userId') || 'guest';
@@ -137,7 +155,7 @@ const Shop = () => {
                 key={product.id}
                 initial={{ opacity: 0, y: 20 }}
                 animate={{ opacity: 1, y: 0 }}
-                transition={{ duration: 0.4, delay: index * 0.05 }}
+                transition={{ duration: 0.4, delay: (index % PAGE_SIZE) * 0.05 }}
                 className="group relative bg-card"
                 data-testid={`product-card-${product.id}`}
               >
@@ -196,6 +214,17 @@ const Shop = () => {
             ))}
           </div>
         )}
+        {!loading && nextCursor && (
+          <div className="text-center mt-12">
+            <button
+              onClick={loadMore}
+              className="border border-primary text-primary px-8 py-3 hover:bg-primary hover:text-white transition-colors duration-300"
+              data-testid="load-more-btn"
+            >
+              Load More
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -24,11 +24,10 @@ const Wishlist = () => {
 
       if (wishlistRes.data.items && wishlistRes.data.items.length > 0) {
         const productIds = wishlistRes.data.items.map(item => item.product_id);
-        const productPromises = productIds.map(id => axios.get(`${API}/products/${id}`));
-        const productResponses = await Promise.all(productPromises);
+        const batchRes = await axios.post(`${API}/products/batch`, { ids: productIds });
         const productsMap = {};
-        productResponses.forEach(res => {
-          productsMap[res.data.id] = res.data;
+        batchRes.data.products.forEach(product => {
+          productsMap[product.id] = product;
         });
         setProducts(productsMap);
       }
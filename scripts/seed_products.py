@@ -1,25 +1,27 @@
 import asyncio
-import sys
-sys.path.append('/app/backend')
-
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
-from dotenv import load_dotenv
-from pathlib import Path
+import sys
 import uuid
 from datetime import datetime, timezone
+from pathlib import Path
 
-ROOT_DIR = Path('/app/backend')
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).resolve().parents[1] / 'backend'
+sys.path.append(str(ROOT_DIR))
 load_dotenv(ROOT_DIR / '.env')
 
+from import_catalog import import_products  # noqa: E402
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 sample_products = [
     {
-        "id": str(uuid.uuid4()),
         "name": "Royal Wedding Embroidered Chappal",
+        "slug": "royal-wedding-embroidered-chappal",
         "description": "Exquisite handcrafted wedding chappal with intricate gold embroidery. Perfect for your special day.",
         "price": 2499,
         "discount_price": 1999,
@@ -29,14 +31,13 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9", "10"],
         "colors": ["Gold", "Silver", "Rose Gold"],
-        "category": "Wedding",
-        "stock": 50,
-        "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-wedding",
+        "stock_quantity": 50,
+        "featured": True
     },
     {
-        "id": str(uuid.uuid4()),
         "name": "Festive Fancy Kolhapuri Chappal",
+        "slug": "festive-fancy-kolhapuri-chappal",
         "description": "Traditional Kolhapuri style with a modern twist. Comfortable and stylish for festive occasions.",
         "price": 1799,
         "discount_price": 1499,
@@ -46,14 +47,13 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9"],
         "colors": ["Maroon", "Red", "Pink"],
-        "category": "Festive",
-        "stock": 40,
-        "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-festive",
+        "stock_quantity": 40,
+        "featured": True
     },
     {
-        "id": str(uuid.uuid4()),
         "name": "Party Wear Sequin Chappal",
+        "slug": "party-wear-sequin-chappal",
         "description": "Glamorous sequin work perfect for parties and celebrations. Comfortable heel height.",
         "price": 1599,
         "discount_price": 1299,
@@ -63,14 +63,13 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9"],
         "colors": ["Gold", "Silver", "Black"],
-        "category": "Party",
-        "stock": 60,
-        "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-party",
+        "stock_quantity": 60,
+        "featured": True
     },
     {
-        "id": str(uuid.uuid4()),
         "name": "Daily Wear Comfort Chappal",
+        "slug": "daily-wear-comfort-chappal",
         "description": "Soft cushioned sole for all-day comfort. Perfect for everyday wear.",
         "price": 999,
         "discount_price": 799,
@@ -80,14 +79,13 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9", "10"],
         "colors": ["Brown", "Beige", "Cream"],
-        "category": "Daily",
-        "stock": 100,
-        "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-daily",
+        "stock_quantity": 100,
+        "featured": True
     },
     {
-        "id": str(uuid.uuid4()),
         "name": "Designer Floral Chappal",
+        "slug": "designer-floral-chappal",
         "description": "Beautiful floral embellishments with hand-stitched details. Ideal for special occasions.",
         "price": 2199,
         "discount_price": 1799,
@@ -97,14 +95,13 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9"],
         "colors": ["Pink", "Peach", "Lavender"],
-        "category": "Designer",
-        "stock": 30,
-        "featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-designer",
+        "stock_quantity": 30,
+        "featured": False
     },
     {
-        "id": str(uuid.uuid4()),
         "name": "Traditional Mojari Style Chappal",
+        "slug": "traditional-mojari-style-chappal",
         "description": "Classic Mojari design with authentic Gujarati craftsmanship.",
         "price": 1899,
         "discount_price": 1599,
@@ -114,14 +111,13 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9"],
         "colors": ["Red", "Green", "Yellow"],
-        "category": "Festive",
-        "stock": 45,
-        "featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-festive",
+        "stock_quantity": 45,
+        "featured": False
     },
     {
-        "id": str(uuid.uuid4()),
         "name": "Pearl Embellished Bridal Chappal",
+        "slug": "pearl-embellished-bridal-chappal",
         "description": "Luxurious pearl work with golden threads. A perfect choice for brides.",
         "price": 3499,
         "discount_price": 2999,
@@ -131,14 +127,13 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9"],
         "colors": ["White", "Ivory", "Champagne"],
-        "category": "Wedding",
-        "stock": 25,
-        "featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-wedding",
+        "stock_quantity": 25,
+        "featured": False
     },
     {
-        "id": str(uuid.uuid4()),
         "name": "Casual Boho Chappal",
+        "slug": "casual-boho-chappal",
         "description": "Trendy bohemian style perfect for casual outings and beach trips.",
         "price": 899,
         "discount_price": 699,
@@ -148,10 +143,9 @@ sample_products = [
         ],
         "sizes": ["5", "6", "7", "8", "9", "10"],
         "colors": ["Tan", "Olive", "Navy"],
-        "category": "Daily",
-        "stock": 80,
-        "featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "category_id": "cat-daily",
+        "stock_quantity": 80,
+        "featured": False
     }
 ]
 
@@ -174,15 +168,15 @@ sample_coupons = [
 
 async def seed_database():
     try:
-        # Clear existing products and coupons
-        await db.products.delete_many({})
-        await db.coupons.delete_many({})
-        
-        # Insert sample data
-        await db.products.insert_many(sample_products)
-        await db.coupons.insert_many(sample_coupons)
+        # Upsert by slug / code so re-seeding keeps the catalog online and ids stable
+        stats = await import_products(db, enumerate(sample_products, start=1), progress=False)
+        for coupon in sample_coupons:
+            fields = {key: value for key, value in coupon.items() if key != "id"}
+            await db.coupons.update_one(
+                {"code": coupon["code"]}, {"$set": fields, "$setOnInsert": {"id": coupon["id"]}}, upsert=True
+            )
         
-        print(f"✅ Successfully seeded {len(sample_products)} products")
+        print(f"✅ Products: {stats.inserted} created, {stats.updated} updated")
         print(f"✅ Successfully seeded {len(sample_coupons)} coupons")
         print("\nCoupon codes:")
         for coupon in sample_coupons:
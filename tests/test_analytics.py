@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import analytics
+
+
+class FakeCollection:
+    def __init__(self, fail_updates=0):
+        self.docs, self.fail_updates = {}, fail_updates
+
+    async def insert_one(self, doc):
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate")
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def delete_one(self, query):
+        self.docs.pop(query["_id"], None)
+
+    async def update_one(self, query, update, upsert=False):
+        if self.fail_updates:
+            self.fail_updates -= 1
+            raise RuntimeError("write failed")
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+
+
+class FakeDB:
+    def __init__(self):
+        self.analytics_applied = FakeCollection()
+
+
+def test_repeated_event_is_applied_once():
+    db, rollup = FakeDB(), FakeCollection()
+    for _ in range(3):
+        asyncio.run(analytics._apply_once(db, "order-paid:o1:summary", rollup, "all", {"$inc": {"revenue": 100}}))
+    assert rollup.docs["all"]["revenue"] == 100
+
+
+def test_failed_write_is_applied_by_the_retry():
+    db, rollup = FakeDB(), FakeCollection(fail_updates=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(analytics._apply_once(db, "e:summary", rollup, "all", {"$inc": {"orders": 1}}))
+    asyncio.run(analytics._apply_once(db, "e:summary", rollup, "all", {"$inc": {"orders": 1}}))
+    asyncio.run(analytics._apply_once(db, "e:summary", rollup, "all", {"$inc": {"orders": 1}}))
+    assert rollup.docs["all"]["orders"] == 1
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from coupons import Coupon, CouponError, normalize_code
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+ENTRIES = {"wed": {"category_id": "cat-wedding"}, "fest": {"category_id": "cat-festive"}}
+
+
+def lines(*items):
+    return [{"product_id": product_id, "price": price, "quantity": quantity} for product_id, price, quantity in items]
+
+
+def test_percent_discount_is_capped():
+    coupon = Coupon({"code": "festive20", "discount_percent": 20, "max_discount": 300})
+    assert coupon.code == "FESTIVE20"
+    assert coupon.evaluate(lines(("wed", 1000.0, 1)), ENTRIES, NOW).discount == 200.0
+    assert coupon.evaluate(lines(("wed", 1000.0, 2)), ENTRIES, NOW).discount == 300.0
+
+
+def test_flat_discount_never_exceeds_the_eligible_amount():
+    coupon = Coupon({"code": "FLAT500", "discount_amount": 500})
+    assert coupon.evaluate(lines(("wed", 300.0, 1)), ENTRIES, NOW).discount == 300.0
+
+
+def test_category_scope_discounts_only_matching_lines():
+    coupon = Coupon({"code": "WED10", "discount_percent": 10, "category_ids": ["cat-wedding"]})
+    quote = coupon.evaluate(lines(("wed", 1000.0, 1), ("fest", 500.0, 2)), ENTRIES, NOW)
+    assert (quote.subtotal, quote.eligible_subtotal, quote.discount) == (2000.0, 1000.0, 100.0)
+    with pytest.raises(CouponError, match="does not apply"):
+        coupon.evaluate(lines(("fest", 500.0, 1)), ENTRIES, NOW)
+
+
+@pytest.mark.parametrize("doc, reason", [
+    ({"active": False}, "no longer active"),
+    ({"starts_at": (NOW + timedelta(days=1)).isoformat()}, "not active yet"),
+    ({"expiry_date": "2026-05-31T23:59:59Z"}, "expired"),
+    ({"max_redemptions": 10, "redemptions": 10}, "usage limit"),
+    ({"min_order_value": 1500}, "Minimum order value"),
+])
+def test_rules_reject_with_a_shopper_facing_reason(doc, reason):
+    coupon = Coupon({"code": "X", "discount_percent": 10, **doc})
+    with pytest.raises(CouponError, match=reason):
+        coupon.evaluate(lines(("wed", 1000.0, 1)), ENTRIES, NOW)
+
+
+def test_code_only_check_skips_cart_rules():
+    coupon = Coupon({"code": "BIG", "discount_percent": 10, "min_order_value": 5000, "category_ids": ["cat-x"]})
+    assert coupon.evaluate(now=NOW).discount == 0.0
+    with pytest.raises(CouponError):
+        coupon.evaluate(lines(("wed", 1000.0, 1)), ENTRIES, NOW)
+
+
+def test_coupon_without_a_discount_is_rejected():
+    with pytest.raises(CouponError, match="no discount"):
+        Coupon({"code": "EMPTY"}).evaluate(now=NOW)
+
+
+def test_codes_are_normalized():
+    assert normalize_code("  festive20 ") == "FESTIVE20"
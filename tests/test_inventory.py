@@ -0,0 +1,116 @@
+import asyncio
+import copy
+
+import inventory
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """The handful of Motor collection calls inventory.py makes."""
+
+    def __init__(self):
+        self.docs = []
+
+    def _find(self, query):
+        return next((doc for doc in self.docs if _matches(doc, query)), None)
+
+    @staticmethod
+    def _apply(doc, update):
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        doc.update(update.get("$set", {}))
+
+    async def insert_one(self, doc):
+        self.docs.append(copy.deepcopy(doc))
+
+    async def find_one(self, query, projection=None):
+        doc = self._find(query)
+        return copy.deepcopy(doc) if doc else None
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        doc = self._find(query)
+        if doc is None:
+            return None
+        before = copy.deepcopy(doc)
+        self._apply(doc, update)
+        return before
+
+    async def update_one(self, query, update):
+        doc = self._find(query)
+        if doc:
+            self._apply(doc, update)
+
+
+class FakeDB:
+    def __init__(self, stock):
+        self.products = FakeCollection()
+        self.stock_reservations = FakeCollection()
+        self.products.docs.append({"id": "p1", "stock_quantity": stock, "in_stock": stock > 0})
+
+    def stock(self):
+        return self.products.docs[0]["stock_quantity"]
+
+    def status(self, order_id):
+        return next(r["status"] for r in self.stock_reservations.docs if r["order_id"] == order_id)
+
+
+ITEMS = [{"product_id": "p1", "size": "7", "color": "Red", "quantity": 1}]
+
+
+def test_commit_after_a_failed_verification_retakes_the_stock():
+    async def scenario():
+        db = FakeDB(stock=1)
+        await inventory.reserve(db, "a", ITEMS)
+        await inventory.release(db, "a")  # A's first verification failed
+        assert db.stock() == 1
+        assert await inventory.commit(db, "a")
+        return db
+
+    db = asyncio.run(scenario())
+    assert db.stock() == 0
+    assert db.status("a") == inventory.COMMITTED
+
+
+def test_released_stock_sold_to_someone_else_is_not_sold_twice():
+    async def scenario():
+        db = FakeDB(stock=1)
+        await inventory.reserve(db, "a", ITEMS)
+        await inventory.release(db, "a")
+        await inventory.reserve(db, "b", ITEMS)
+        assert await inventory.commit(db, "b")
+        committed = await inventory.commit(db, "a")  # A's payment verifies late
+        # Cancelling A must not hand back stock it never got
+        await inventory.release(db, "a", include_committed=True)
+        return db, committed
+
+    db, committed = asyncio.run(scenario())
+    assert committed is False
+    assert db.stock() == 0
+    assert db.status("a") == inventory.RELEASED
+    assert db.status("b") == inventory.COMMITTED
+
+
+def test_commit_is_idempotent():
+    async def scenario():
+        db = FakeDB(stock=2)
+        await inventory.reserve(db, "a", ITEMS)
+        assert await inventory.commit(db, "a")
+        assert await inventory.commit(db, "a")
+        return db
+
+    assert asyncio.run(scenario()).stock() == 1
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 0.001)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_failing_job_is_retried_until_it_succeeds():
+    async def scenario():
+        queue, attempts = JobQueue(concurrency=2, max_attempts=3), []
+
+        @queue.handler("flaky")
+        async def flaky(n):
+            attempts.append(n)
+            if len(attempts) < 3:
+                raise RuntimeError("boom")
+
+        await queue.start()
+        await queue.enqueue("flaky", n=1)
+        assert await queue.drain(1)
+        return attempts
+
+    assert run(scenario()) == [1, 1, 1]
+
+
+def test_job_gives_up_after_max_attempts():
+    async def scenario():
+        queue, attempts = JobQueue(max_attempts=2), []
+
+        @queue.handler("broken")
+        async def broken():
+            attempts.append(1)
+            raise RuntimeError("always")
+
+        await queue.start()
+        await queue.enqueue("broken")
+        assert await queue.drain(1)
+        return len(attempts), queue._unfinished
+
+    assert run(scenario()) == (2, 0)
+
+
+def test_concurrency_is_bounded():
+    async def scenario():
+        queue, running, peak = JobQueue(concurrency=2), [0], [0]
+
+        @queue.handler("slow")
+        async def slow():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+
+        await queue.start()
+        for _ in range(6):
+            await queue.enqueue("slow")
+        assert await queue.drain(1)
+        return peak[0]
+
+    assert run(scenario()) == 2
+
+
+def test_drain_times_out_on_stuck_jobs():
+    async def scenario():
+        queue = JobQueue()
+
+        @queue.handler("stuck")
+        async def stuck():
+            await asyncio.sleep(60)
+
+        await queue.start()
+        await queue.enqueue("stuck")
+        return await queue.drain(0.01)
+
+    assert run(scenario()) is False
+
+
+def test_enqueue_runs_inline_when_the_queue_is_not_running():
+    async def scenario():
+        queue, done = JobQueue(), []
+
+        @queue.handler("record")
+        async def record(value):
+            done.append(value)
+
+        await queue.enqueue("record", value=1)
+        return done
+
+    assert run(scenario()) == [1]
+
+
+def test_unknown_job_is_rejected():
+    with pytest.raises(KeyError):
+        run(JobQueue().enqueue("nope"))
@@ -0,0 +1,176 @@
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+from bson import ObjectId
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "jasubhai_test")
+os.environ.setdefault("ENSURE_INDEXES", "0")
+
+import server  # noqa: E402
+from lean import FastJSONResponse  # noqa: E402
+
+_MISSING = object()
+
+# BSON dates have millisecond precision
+NOW = datetime(2026, 10, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+
+def _field(path: str, doc: dict, variables: dict) -> Any:
+    if path.startswith("$$"):
+        name, _, rest = path[2:].partition(".")
+        value, parts = variables[name], rest.split(".") if rest else []
+    else:
+        value, parts = doc, path[1:].split(".")
+    for part in parts:
+        value = value.get(part, _MISSING) if isinstance(value, dict) else _MISSING
+    return value
+
+
+def _null(value) -> bool:
+    return value is None or value is _MISSING
+
+
+def _expr(expression, doc: dict, variables: dict) -> Any:
+    """Evaluate the aggregation expressions the lean projections use."""
+    if isinstance(expression, str):
+        return _field(expression, doc, variables) if expression.startswith("$") else expression
+    if isinstance(expression, list):
+        return [_expr(e, doc, variables) for e in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not any(key.startswith("$") for key in expression):
+        out = {key: _expr(e, doc, variables) for key, e in expression.items()}
+        return {key: value for key, value in out.items() if value is not _MISSING}
+    (op, args), = expression.items()
+    if op == "$literal":
+        return args
+    if op == "$ifNull":
+        *values, fallback = args
+        for value in values:
+            value = _expr(value, doc, variables)
+            if not _null(value):
+                return value
+        return _expr(fallback, doc, variables)
+    if op == "$convert":
+        assert args["to"] == "double", args
+        value = _expr(args["input"], doc, variables)
+        return args.get("onNull") if _null(value) else float(value)
+    if op == "$map":
+        items = _expr(args["input"], doc, variables)
+        if _null(items):
+            return None
+        return [_expr(args["in"], doc, {**variables, args.get("as", "this"): item}) for item in items]
+    if op == "$toLower":
+        value = _expr(args, doc, variables)
+        return "" if _null(value) else value.lower()
+    if op == "$replaceAll":
+        value = _expr(args["input"], doc, variables)
+        return None if _null(value) else value.replace(args["find"], args["replacement"])
+    if op == "$gt":
+        left, right = (_expr(e, doc, variables) for e in args)
+        return left is not _MISSING and left is not None and left > right
+    raise NotImplementedError(f"test_lean cannot evaluate {op}; teach _expr about it")
+
+
+def project(doc: dict, projection: dict) -> dict:
+    """Apply an expression projection to ``doc`` the way ``$project`` would."""
+    out = {}
+    for key, expression in projection.items():
+        if expression == 0:
+            continue
+        value = _expr(expression, doc, {})
+        if value is not _MISSING:
+            out[key] = value
+    return out
+
+
+def same(a, b) -> bool:
+    """Equal JSON values of the same types (so 1999 and 1999.0 differ)."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def assert_lean_matches(model, projection, doc):
+    lean = json.loads(FastJSONResponse(project(doc, projection)).body)
+    expected = model.model_validate(doc).model_dump(mode="json")
+    assert same(lean, expected), f"\n  lean:      {lean}\n  validated: {expected}"
+
+
+def product_doc(**changes):
+    doc = {
+        "_id": ObjectId(), "id": str(uuid.uuid4()), "name": "Royal Bridal Chappal", "slug": "royal-bridal-chappal",
+        "description": "Handcrafted chappal with intricate zari embroidery.", "price": 1999.0,
+        "discount_price": 1499.0, "category_id": "cat-wedding", "images": ["https://example.com/1.jpg"],
+        "sizes": ["6", "7"], "colors": ["Red Gold"], "care_instructions": "Wipe with dry cloth.",
+        "in_stock": True, "stock_quantity": 25, "featured": True, "created_at": NOW, "updated_at": NOW,
+        "rating_count": 2, "rating_sum": 9, "rating_avg": 4.5,
+        "rating_histogram": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1},
+        # Stored by imports, not part of the API shape
+        "import_run": "run-1", "name_key": "royal bridal chappal",
+    }
+    doc.update(changes)
+    return {key: value for key, value in doc.items() if value is not _MISSING}
+
+
+def order_doc(**changes):
+    doc = {
+        "_id": ObjectId(), "id": str(uuid.uuid4()), "order_number": "ORD0000002A", "user_id": "user-1",
+        "items": [{"product_id": str(uuid.uuid4()), "product_name": "Royal Bridal Chappal", "quantity": 2,
+                   "size": "7", "color": "Red Gold", "price": 1999.0}],
+        "shipping_address": {"name": "Asha Patel", "phone": "9876543210", "address_line1": "12 Station Road",
+                             "city": "Mahemdavad", "state": "Gujarat", "pincode": "387130"},
+        "subtotal": 3998.0, "discount": 0.0, "total": 3998.0, "payment_status": "completed",
+        "order_status": "confirmed", "razorpay_order_id": "order_00000000000042",
+        "created_at": NOW, "updated_at": NOW, "coupon_redeemed": False,
+    }
+    doc.update(changes)
+    return {key: value for key, value in doc.items() if value is not _MISSING}
+
+
+@pytest.mark.parametrize("doc", [
+    product_doc(),
+    # Imported and hand-edited rows store whole prices as integers
+    product_doc(price=1999, discount_price=1499),
+    product_doc(discount_price=_MISSING),
+    # Products that predate the rating aggregates
+    product_doc(rating_count=_MISSING, rating_sum=_MISSING, rating_avg=_MISSING, rating_histogram=_MISSING),
+    product_doc(rating_avg=0),
+    product_doc(featured=_MISSING, care_instructions=_MISSING, images=_MISSING),
+], ids=["complete", "integer_prices", "no_discount", "no_ratings", "integer_rating", "missing_optionals"])
+def test_product_projection_matches_the_model(doc):
+    assert_lean_matches(server.Product, server.PRODUCT_PROJECTION, doc)
+
+
+@pytest.mark.parametrize("doc", [
+    order_doc(),
+    order_doc(subtotal=3998, total=3998, items=[{**order_doc()["items"][0], "price": 1999}]),
+    order_doc(coupon_code="FESTIVE20", discount=500.0, total=3498.0, coupon_redeemed=True),
+    # Created before payment and status defaults were stored
+    order_doc(payment_status=_MISSING, order_status=_MISSING, discount=_MISSING),
+    order_doc(shipping_address={**order_doc()["shipping_address"], "address_line2": "Near the temple"}),
+], ids=["complete", "integer_prices", "coupon", "missing_defaults", "address_line2"])
+def test_order_projection_matches_the_model(doc):
+    assert_lean_matches(server.Order, server.ORDER_PROJECTION, doc)
+
+
+def test_review_projection_matches_the_model():
+    doc = {
+        "_id": ObjectId(), "id": str(uuid.uuid4()), "product_id": "prod-wed-1", "user_id": "user-1",
+        "user_name": "Asha", "rating": 5, "comment": "Beautiful work.", "created_at": NOW - timedelta(hours=1),
+    }
+    assert_lean_matches(server.Review, server.REVIEW_PROJECTION, doc)
+
+
+def test_stored_only_fields_are_dropped():
+    row = project(product_doc(), server.PRODUCT_PROJECTION)
+    assert "_id" not in row and "import_run" not in row and "name_key" not in row
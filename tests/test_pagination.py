@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from pagination import decode_cursor, encode_cursor, keyset_filter, paginate, rows_after, sort_rows
+
+NEWEST = [("created_at", -1), ("id", -1)]
+PRICE = [("price", 1), ("id", 1)]
+RELEVANCE = [("_score", -1), ("id", 1)]
+
+
+class Row(BaseModel):
+    id: str
+    price: float
+    discount_price: Optional[float] = None
+    created_at: datetime
+
+
+def token(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    now = datetime.now(timezone.utc)
+    assert decode_cursor(encode_cursor([now, "a"]), NEWEST, Row) == [now, "a"]
+    assert decode_cursor(encode_cursor([12, "a"]), PRICE, Row) == [12, "a"]
+    assert decode_cursor(encode_cursor([0.5, "a"]), RELEVANCE, Row) == [0.5, "a"]
+    assert decode_cursor(encode_cursor([None, "a"]), [("discount_price", 1), ("id", 1)], Row) == [None, "a"]
+
+
+@pytest.mark.parametrize("values, sort", [
+    ([{"$ne": None}, "a"], NEWEST),
+    ([{"$date": "2026-01-01T00:00:00+00:00", "$where": "1"}, "a"], NEWEST),
+    ([{"$date": 5}, "a"], NEWEST),
+    (["2026-01-01T00:00:00+00:00", "a"], NEWEST),
+    ([1, {"$gt": ""}], PRICE),
+    ([[1], "a"], PRICE),
+    ([True, "a"], PRICE),
+    ([None, "a"], PRICE),
+    (["1", "a"], RELEVANCE),
+    ([1], PRICE),
+])
+def test_decode_cursor_rejects_values_that_do_not_fit_the_sort(values, sort):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(token(values), sort, Row)
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("raw", ["not base64 !", token({"a": 1}), base64.urlsafe_b64encode(b"\xff").decode()])
+def test_decode_cursor_rejects_garbage(raw):
+    with pytest.raises(HTTPException):
+        decode_cursor(raw, PRICE, Row)
+
+
+def test_keyset_filter_selects_rows_after_the_cursor():
+    assert keyset_filter(PRICE, [10, "b"]) == {"$or": [
+        {"price": {"$gt": 10}},
+        {"price": 10, "id": {"$gt": "b"}},
+    ]}
+
+
+def test_paginating_in_memory_visits_every_row_once():
+    now = datetime.now(timezone.utc)
+    rows = [{"id": f"p{i}", "created_at": now - timedelta(minutes=i // 2)} for i in range(7)]
+    rows = sort_rows(rows, NEWEST)
+    seen, cursor = [], None
+    while True:
+        remaining = rows_after(rows, NEWEST, decode_cursor(cursor, NEWEST, Row)) if cursor else rows
+        page, cursor = paginate(remaining[:3], NEWEST, 2)
+        seen += [row["id"] for row in page]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(row["id"] for row in rows)
+    assert len(seen) == len(set(seen))
+
+
+def test_missing_sort_values_order_like_mongo():
+    rows = [{"id": "a", "price": 20.0}, {"id": "b"}, {"id": "c", "price": 10.0}, {"id": "d", "price": None}]
+    assert [row["id"] for row in sort_rows(list(rows), PRICE)] == ["b", "d", "c", "a"]
+    assert [row["id"] for row in sort_rows(list(rows), [("price", -1), ("id", 1)])] == ["a", "c", "b", "d"]
+
+
+def test_rows_after_a_missing_sort_value():
+    rows = sort_rows([{"id": "a", "price": 20.0}, {"id": "b"}, {"id": "c"}, {"id": "d", "price": 10.0}], PRICE)
+    assert [row["id"] for row in rows_after(rows, PRICE, [None, "b"])] == ["c", "d", "a"]
+    assert [row["id"] for row in rows_after(rows, PRICE, [10.0, "d"])] == ["a"]
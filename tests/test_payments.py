@@ -0,0 +1,130 @@
+import asyncio
+
+import httpx
+import pytest
+
+from payments import CircuitBreaker, OrderRejectedError, PaymentGatewayError, RazorpayGateway
+
+
+def half_open(breaker: CircuitBreaker) -> CircuitBreaker:
+    breaker.opened_at -= breaker.reset_timeout
+    return breaker
+
+
+def test_breaker_opens_after_the_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    half_open(breaker)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_trial_outcome_closes_or_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    half_open(breaker).allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    half_open(breaker).allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_abandoned_trial_frees_the_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    half_open(breaker).allow()
+    breaker.abandon()
+    assert breaker.state == "half-open" and breaker.allow()
+
+
+def gateway(handler, breaker=None) -> RazorpayGateway:
+    gw = RazorpayGateway("key", "secret", backoff=0, max_retries=2, breaker=breaker)
+    gw._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url=RazorpayGateway.base_url)
+    return gw
+
+
+def counting(respond):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return respond(request)
+    return handler, calls
+
+
+def test_connect_errors_are_retried():
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+    handler, calls = counting(refuse)
+    with pytest.raises(PaymentGatewayError):
+        asyncio.run(gateway(handler).create_order(100))
+    assert len(calls) == 3
+
+
+def read_timeout(request):
+    raise httpx.ReadTimeout("slow", request=request)
+
+
+@pytest.mark.parametrize("respond", [read_timeout, lambda request: httpx.Response(502)])
+def test_requests_that_may_have_been_processed_are_not_retried(respond):
+    handler, calls = counting(respond)
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(PaymentGatewayError):
+        asyncio.run(gateway(handler, breaker).create_order(100))
+    assert len(calls) == 1
+    assert breaker.state == "open"
+
+
+def test_rejection_counts_as_a_healthy_gateway():
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(OrderRejectedError):
+        asyncio.run(gateway(lambda request: httpx.Response(400, text="bad amount"), breaker).create_order(100))
+    assert breaker.state == "closed"
+
+
+def test_unexpected_error_during_a_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    half_open(breaker)
+    with pytest.raises(PaymentGatewayError):
+        asyncio.run(gateway(lambda request: httpx.Response(200, content=b"not json"), breaker).create_order(100))
+    assert breaker.state == "open"
+    assert not breaker._trial_in_flight
+
+
+def test_cancelled_trial_lets_the_next_call_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    half_open(breaker)
+
+    class Hang(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            await asyncio.sleep(60)
+
+    async def cancel_trial():
+        gw = RazorpayGateway("key", "secret", breaker=breaker)
+        gw._client = httpx.AsyncClient(transport=Hang(), base_url=RazorpayGateway.base_url)
+        task = asyncio.create_task(gw.create_order(100))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert breaker.allow()
+
+
+def test_success_returns_the_gateway_order():
+    order = {"id": "order_1", "amount": 100}
+    assert asyncio.run(gateway(lambda request: httpx.Response(200, json=order)).create_order(100)) == order
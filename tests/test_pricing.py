@@ -0,0 +1,76 @@
+import asyncio
+
+from pricing import PriceBook, price_items, unit_price
+
+
+class FakeProducts:
+    """Just enough of a Motor collection for PriceBook."""
+
+    def __init__(self, rows, on_find=None):
+        self.rows, self.on_find, self.queries = rows, on_find, []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        ids = query.get("id", {}).get("$in")
+        rows = [dict(row) for row in self.rows if ids is None or row["id"] in ids]
+        return FakeCursor(rows, self.on_find)
+
+
+class FakeCursor:
+    def __init__(self, rows, on_find):
+        self.rows, self.on_find = rows, on_find
+
+    async def to_list(self, length):
+        if self.on_find:
+            self.on_find()
+        return self.rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield row
+
+
+def product(product_id, price, discount_price=None):
+    return {"id": product_id, "name": product_id.upper(), "price": price, "discount_price": discount_price,
+            "category_id": "cat-wedding"}
+
+
+def test_unit_price_prefers_the_discount():
+    assert unit_price(product("a", 1000.0, 799.0)) == 799.0
+    assert unit_price(product("a", 1000.0)) == 1000.0
+
+
+def test_price_items_uses_catalog_names_and_prices():
+    entries = {"a": product("a", 1000.0, 799.0), "b": product("b", 250.5)}
+    items = [{"product_id": "a", "quantity": 2, "price": 1.0, "product_name": "forged"},
+             {"product_id": "b", "quantity": 3}]
+    lines, subtotal = price_items(items, entries)
+    assert [(line["product_name"], line["price"]) for line in lines] == [("A", 799.0), ("B", 250.5)]
+    assert subtotal == 2349.5
+
+
+def test_lookup_fetches_unknown_products_once():
+    products = FakeProducts([product("a", 100.0)])
+    book = PriceBook(ttl=60)
+    asyncio.run(book.refresh(products))
+    products.rows.append(product("b", 200.0))
+
+    entries = asyncio.run(book.lookup(products, ["a", "b", "missing"]))
+    assert set(entries) == {"a", "b"}
+    asyncio.run(book.lookup(products, ["b"]))
+    assert products.queries[1:] == [{"id": {"$in": ["b", "missing"]}}]
+
+
+def test_writes_during_a_reload_survive_it():
+    book = PriceBook(ttl=60)
+    products = FakeProducts(
+        [product("a", 100.0), product("b", 200.0)],
+        # A product route writes while the snapshot is in flight
+        on_find=lambda: (book.update(product("a", 90.0)), book.remove("b")),
+    )
+    asyncio.run(book.refresh(products, force=True))
+    assert book.entries["a"]["price"] == 90.0
+    assert "b" not in book.entries
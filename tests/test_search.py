@@ -0,0 +1,28 @@
+from search import ProductSearchIndex, name_key
+
+
+def product(id, **fields):
+    return {"id": id, "name": f"Chappal {id}", **fields}
+
+
+def price_facets(*products):
+    index = ProductSearchIndex(list(products))
+    return {bucket["min"]: bucket["count"] for bucket in index.facets(list(products))["price"]}
+
+
+def test_price_facets_fall_back_only_when_there_is_no_discount():
+    # $ifNull semantics: a zero discount price is still a price
+    assert price_facets(product("a", price=1999.0, discount_price=0.0)) == {0: 1}
+    assert price_facets(product("b", price=1999.0, discount_price=None)) == {1500: 1}
+    assert price_facets(product("c", price=1999.0)) == {1500: 1}
+    assert price_facets(product("d", price=1999.0, discount_price=1499.0)) == {1000: 1}
+
+
+def test_unpriced_products_are_left_out_of_the_price_facets():
+    facets = ProductSearchIndex([product("a")]).facets([product("a")])
+    assert facets["total"] == 1 and facets["price"] == []
+
+
+def test_name_key_normalizes_case_and_punctuation():
+    assert name_key("  Royal BRIDAL-Chappal (Red) ") == "royal bridal chappal red"
+    assert name_key(None) == ""